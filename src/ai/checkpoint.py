@@ -0,0 +1,141 @@
+import os
+import queue
+import random
+import shutil
+import threading
+from typing import Any, Dict, List, Optional
+import numpy as np
+import torch
+
+def snapshot(obj: Any) -> Any:
+    """Detach a (nested) state dict onto the CPU so training can keep mutating the original"""
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to('cpu', copy=True)
+    if isinstance(obj, dict):
+        return {k: snapshot(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(snapshot(v) for v in obj)
+    return obj
+
+def capture_rng_state() -> Dict[str, Any]:
+    # Plain containers only, so the state loads with torch.load(weights_only=True)
+    name, keys, position, has_gauss, cached_gaussian = np.random.get_state()
+    state = {
+        'python': random.getstate(),
+        'numpy': (name, keys.tolist(), position, has_gauss, cached_gaussian),
+        'torch': torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+def restore_rng_state(state: Dict[str, Any]) -> None:
+    random.setstate(state['python'])
+    name, keys, position, has_gauss, cached_gaussian = state['numpy']
+    np.random.set_state((name, np.asarray(keys, dtype=np.uint32), position, has_gauss, cached_gaussian))
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+class AsyncCheckpointer:
+    """Writes sharded step checkpoints from a background thread.
+
+    Each checkpoint is a `step_<n>` directory holding one file per shard
+    (`model.pt`, `optimizer.pt` from rank 0 and `trainer.rank<r>.pt` from every
+    rank). A rank marks its shards complete with an empty `done.rank<r>` file,
+    so a checkpoint only counts once every rank has finished writing it.
+    """
+    def __init__(self, directory: str, rank: int = 0, world_size: int = 1, keep: int = 2):
+        self.directory = directory
+        self.rank = rank
+        self.world_size = world_size
+        self.keep = keep
+        self._queue: queue.Queue = queue.Queue(maxsize=1)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._writer, name='checkpoint-writer', daemon=True)
+        os.makedirs(directory, exist_ok=True)
+        self._thread.start()
+
+    def save(self, step: int, shards: Dict[str, Dict[str, Any]]) -> None:
+        """Snapshot `shards` now and write them in the background.
+
+        Blocks only while a previous checkpoint is still being written.
+        """
+        self._raise_pending_error()
+        self._queue.put((step, snapshot(shards)))
+
+    def wait(self) -> None:
+        """Block until every queued checkpoint has been written"""
+        self._queue.join()
+        self._raise_pending_error()
+
+    def close(self) -> None:
+        self.wait()
+        self._queue.put(None)
+        self._thread.join()
+
+    def latest(self) -> Optional[str]:
+        """Return the newest checkpoint directory that every rank completed"""
+        for step in sorted(self._steps(), reverse=True):
+            if self._is_complete(step):
+                return self._step_dir(step)
+        return None
+
+    def load(self, path: str, shard: str) -> Dict[str, Any]:
+        return torch.load(os.path.join(path, f'{shard}.pt'), map_location='cpu')
+
+    def _writer(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                step, shards = item
+                self._write(step, shards)
+            except BaseException as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _write(self, step: int, shards: Dict[str, Dict[str, Any]]) -> None:
+        path = self._step_dir(step)
+        os.makedirs(path, exist_ok=True)
+        for name, state in shards.items():
+            target = os.path.join(path, f'{name}.pt')
+            torch.save(state, target + '.tmp')
+            os.replace(target + '.tmp', target)
+        open(os.path.join(path, f'done.rank{self.rank}'), 'w').close()
+
+        if self.rank == 0:
+            self._prune()
+
+    def _prune(self) -> None:
+        steps = sorted(self._steps())
+        complete = [step for step in steps if self._is_complete(step)]
+        if not complete:
+            return
+        # Ranks write their checkpoints in order, so every rank is done with any
+        # step older than a completed one; newer steps may still be in flight
+        oldest_kept = complete[-max(self.keep, 1):][0]
+        for step in steps:
+            if step < oldest_kept:
+                shutil.rmtree(self._step_dir(step), ignore_errors=True)
+
+    def _is_complete(self, step: int) -> bool:
+        path = self._step_dir(step)
+        return all(os.path.exists(os.path.join(path, f'done.rank{r}')) for r in range(self.world_size))
+
+    def _steps(self) -> List[int]:
+        steps = []
+        for name in os.listdir(self.directory):
+            if name.startswith('step_') and name[5:].isdigit():
+                steps.append(int(name[5:]))
+        return steps
+
+    def _step_dir(self, step: int) -> str:
+        return os.path.join(self.directory, f'step_{step:010d}')
+
+    def _raise_pending_error(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError('Checkpoint write failed') from error
@@ -0,0 +1,295 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import torch
+import torch.nn as nn
+
+class AgentGraph:
+    """Incrementally built agent graph with lazily materialized CSR adjacency"""
+    def __init__(self, num_features: int, undirected: bool = True, initial_capacity: int = 1024,
+                 max_pending_edges: int = 1 << 16):
+        self.num_features = num_features
+        self.undirected = undirected
+        self.max_pending_edges = max_pending_edges
+        self.node_index: Dict[str, int] = {}
+        self.node_ids: List[str] = []
+        self._features = torch.zeros(initial_capacity, num_features)
+        self._src = torch.empty(initial_capacity, dtype=torch.long)
+        self._dst = torch.empty(initial_capacity, dtype=torch.long)
+        self._num_edges = 0
+        # Only edges added since the last compaction are tracked in Python;
+        # older ones are looked up in the sorted in-adjacency
+        self._pending = set()
+        self._in_csr: Optional[Tuple[torch.Tensor, torch.Tensor]] = None
+        self._out_csr: Optional[Tuple[torch.Tensor, torch.Tensor]] = None
+        self._csr_nodes = 0
+        self._touched = set()
+
+    @classmethod
+    def from_protocol(cls, protocol: Any, featurizer: Callable[[Dict[str, Any]], torch.Tensor],
+                      num_features: int, undirected: bool = True) -> 'AgentGraph':
+        """Build a graph from the agents and connections of an A2A protocol"""
+        graph = cls(num_features, undirected=undirected, initial_capacity=max(len(protocol.agents), 1))
+        for agent_id, agent in protocol.agents.items():
+            graph.add_agent(agent_id, featurizer(agent))
+        for agent_id, peers in protocol.connections.items():
+            for peer_id in peers:
+                graph.add_edge(agent_id, peer_id)
+        return graph
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self) -> int:
+        return self._num_edges
+
+    @property
+    def x(self) -> torch.Tensor:
+        return self._features[:self.num_nodes]
+
+    @property
+    def edge_index(self) -> torch.Tensor:
+        self._compact()
+        return torch.stack([self._src[:self._num_edges], self._dst[:self._num_edges]])
+
+    def add_agent(self, agent_id: str, features: torch.Tensor) -> int:
+        """Register an agent or update the features of a known one"""
+        index = self.node_index.get(agent_id)
+        if index is None:
+            index = self.num_nodes
+            if index == self._features.size(0):
+                self._features = self._grow(self._features)
+            self.node_index[agent_id] = index
+            self.node_ids.append(agent_id)
+        self._features[index] = features.reshape(-1)
+        self._touched.add(index)
+        return index
+
+    def add_edge(self, from_agent: str, to_agent: str) -> None:
+        """Add a directed edge (and its reverse when undirected)"""
+        if from_agent not in self.node_index or to_agent not in self.node_index:
+            raise ValueError('Invalid agent ID')
+
+        src, dst = self.node_index[from_agent], self.node_index[to_agent]
+        self._append_edge(src, dst)
+        if self.undirected and src != dst:
+            self._append_edge(dst, src)
+
+    def observe_message(self, message: Dict[str, Any]) -> None:
+        """Add the edge implied by an A2A message envelope"""
+        self.add_edge(message['from'], message['to'])
+
+    def indices(self, agent_ids: Iterable[str]) -> torch.Tensor:
+        return torch.tensor([self.node_index[agent_id] for agent_id in agent_ids], dtype=torch.long)
+
+    def pop_touched(self) -> torch.Tensor:
+        """Return and clear the nodes whose features or in-edges changed"""
+        touched = torch.tensor(sorted(self._touched), dtype=torch.long)
+        self._touched.clear()
+        return touched
+
+    def in_degree(self) -> torch.Tensor:
+        rowptr, _ = self._in_adjacency()
+        return rowptr[1:] - rowptr[:-1]
+
+    def gcn_weight(self, src: torch.Tensor, dst: torch.Tensor) -> torch.Tensor:
+        """Symmetric GCN normalization of edges using full-graph degrees (self-loops included)"""
+        deg_inv_sqrt = (self.in_degree() + 1).to(self._features.dtype).pow(-0.5)
+        return deg_inv_sqrt[src] * deg_inv_sqrt[dst]
+
+    def sample_in_neighbors(self, nodes: torch.Tensor, fanout: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Sample up to `fanout` in-neighbors per node, returning (src, dst) pairs"""
+        rowptr, col = self._in_adjacency()
+        start = rowptr[nodes]
+        degree = rowptr[nodes + 1] - start
+
+        # Nodes at or below the fanout keep their full neighborhood
+        full = degree <= fanout
+        full_deg = degree[full]
+        full_dst = torch.repeat_interleave(nodes[full], full_deg)
+        full_offsets = torch.arange(full_dst.numel()) - torch.repeat_interleave(
+            torch.cumsum(full_deg, 0) - full_deg, full_deg)
+        full_src = col[torch.repeat_interleave(start[full], full_deg) + full_offsets]
+
+        # High-degree nodes draw `fanout` neighbors uniformly with replacement
+        sampled = ~full
+        sampled_dst = nodes[sampled].repeat_interleave(fanout)
+        draws = (torch.rand(sampled_dst.numel()) * degree[sampled].repeat_interleave(fanout)).long()
+        sampled_src = col[start[sampled].repeat_interleave(fanout) + draws]
+
+        src = torch.cat([full_src, sampled_src])
+        dst = torch.cat([full_dst, sampled_dst])
+        if sampled_src.numel():
+            pairs = torch.unique(torch.stack([src, dst]), dim=1)
+            src, dst = pairs[0], pairs[1]
+        return src, dst
+
+    def out_neighbors(self, nodes: torch.Tensor) -> torch.Tensor:
+        rowptr, col = self._out_adjacency()
+        start = rowptr[nodes]
+        degree = rowptr[nodes + 1] - start
+        offsets = torch.arange(int(degree.sum())) - torch.repeat_interleave(
+            torch.cumsum(degree, 0) - degree, degree)
+        return col[torch.repeat_interleave(start, degree) + offsets]
+
+    def _append_edge(self, src: int, dst: int) -> None:
+        # GCN normalization already gives every node exactly one self-loop
+        if src == dst:
+            return
+        key = (dst << 32) | src
+        if key in self._pending or self._has_compacted_edge(src, dst):
+            return
+        if self._num_edges == self._src.size(0):
+            self._src = self._grow(self._src)
+            self._dst = self._grow(self._dst)
+        self._src[self._num_edges] = src
+        self._dst[self._num_edges] = dst
+        self._num_edges += 1
+        self._pending.add(key)
+        self._touched.add(dst)
+        if len(self._pending) >= self.max_pending_edges:
+            self._compact()
+
+    def _has_compacted_edge(self, src: int, dst: int) -> bool:
+        if self._in_csr is None or dst >= self._csr_nodes:
+            return False
+        rowptr, col = self._in_csr
+        neighbors = col[rowptr[dst]:rowptr[dst + 1]]
+        position = int(torch.searchsorted(neighbors, src))
+        return position < neighbors.numel() and int(neighbors[position]) == src
+
+    def _compact(self) -> None:
+        """Dedupe and sort the edge buffers by (dst, src), then rebuild both CSRs"""
+        if not self._pending and self._csr_nodes == self.num_nodes and self._in_csr is not None:
+            return
+
+        keys = torch.unique((self._dst[:self._num_edges] << 32) | self._src[:self._num_edges])
+        self._num_edges = keys.numel()
+        self._dst[:self._num_edges] = keys >> 32
+        self._src[:self._num_edges] = keys & 0xFFFFFFFF
+        self._pending.clear()
+
+        src, dst = self._src[:self._num_edges], self._dst[:self._num_edges]
+        # Rows of the in-adjacency come out with sorted columns, which _has_compacted_edge relies on
+        self._in_csr = (self._rowptr(dst), src.clone())
+        order = torch.argsort(src, stable=True)
+        self._out_csr = (self._rowptr(src), dst[order])
+        self._csr_nodes = self.num_nodes
+
+    def _in_adjacency(self) -> Tuple[torch.Tensor, torch.Tensor]:
+        self._compact()
+        return self._in_csr
+
+    def _out_adjacency(self) -> Tuple[torch.Tensor, torch.Tensor]:
+        self._compact()
+        return self._out_csr
+
+    def _rowptr(self, row: torch.Tensor) -> torch.Tensor:
+        counts = torch.bincount(row, minlength=self.num_nodes)
+        rowptr = torch.zeros(self.num_nodes + 1, dtype=torch.long)
+        rowptr[1:] = torch.cumsum(counts, 0)
+        return rowptr
+
+    @staticmethod
+    def _grow(buffer: torch.Tensor) -> torch.Tensor:
+        grown = buffer.new_zeros((buffer.size(0) * 2,) + tuple(buffer.shape[1:]))
+        grown[:buffer.size(0)] = buffer
+        return grown
+
+class SampledGraphInference:
+    """Mini-batched, neighbor-sampled BehaviorAnalyzer inference with an embedding cache"""
+    def __init__(self, model: nn.Module, graph: AgentGraph, fanouts: Sequence[int] = (15, 10),
+                 batch_size: int = 1024):
+        if len(fanouts) != model.num_layers:
+            raise ValueError(f'Expected {model.num_layers} fanouts, got {len(fanouts)}')
+        self.model = model
+        self.graph = graph
+        self.fanouts = list(fanouts)
+        self.batch_size = batch_size
+        self.embeddings = torch.zeros(0, model.hidden_channels)
+        self.valid = torch.zeros(0, dtype=torch.bool)
+
+    def refresh(self) -> int:
+        """Recompute embeddings for nodes whose receptive field changed"""
+        self._invalidate(self.graph.pop_touched())
+        stale = torch.nonzero(~self.valid, as_tuple=False).view(-1)
+        if stale.numel() == 0:
+            return 0
+
+        was_training = self.model.training
+        self.model.eval()
+        with torch.no_grad():
+            for seeds in torch.split(stale, self.batch_size):
+                n_id, edge_index, edge_weight = self._sample_subgraph(seeds)
+                out = self.model.embed(self.graph.x[n_id], edge_index, edge_weight)
+                self.embeddings[seeds] = out[:seeds.numel()]
+        self.model.train(was_training)
+        self.valid[stale] = True
+        return stale.numel()
+
+    def embed(self, agent_ids: Optional[Iterable[str]] = None) -> torch.Tensor:
+        """Return cached node embeddings, refreshing stale neighborhoods first"""
+        self.refresh()
+        if agent_ids is None:
+            return self.embeddings
+        return self.embeddings[self.graph.indices(agent_ids)]
+
+    def score(self, agent_ids: Optional[Iterable[str]] = None) -> torch.Tensor:
+        """Score the (sub)network formed by `agent_ids`, or the whole graph"""
+        x = self.embed(agent_ids)
+        with torch.no_grad():
+            return self.model.readout(x, torch.zeros(x.size(0), dtype=torch.long))
+
+    def _invalidate(self, touched: torch.Tensor) -> None:
+        num_nodes = self.graph.num_nodes
+        if self.valid.numel() < num_nodes:
+            self.embeddings = torch.cat([
+                self.embeddings,
+                self.embeddings.new_zeros(num_nodes - self.embeddings.size(0), self.embeddings.size(1))
+            ])
+            self.valid = torch.cat([self.valid, self.valid.new_zeros(num_nodes - self.valid.numel())])
+        if touched.numel() == 0:
+            return
+
+        # A change at a node reaches every node within num_layers outgoing hops
+        dirty = torch.zeros(num_nodes, dtype=torch.bool)
+        dirty[touched] = True
+        frontier = touched
+        for _ in range(self.model.num_layers):
+            frontier = self.graph.out_neighbors(frontier)
+            frontier = frontier[~dirty[frontier]].unique()
+            if frontier.numel() == 0:
+                break
+            dirty[frontier] = True
+        self.valid &= ~dirty
+
+    def _sample_subgraph(self, seeds: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        n_id = seeds
+        frontier = seeds
+        srcs, dsts = [], []
+        for fanout in self.fanouts:
+            src, dst = self.graph.sample_in_neighbors(frontier, fanout)
+            srcs.append(src)
+            dsts.append(dst)
+            frontier = src[~torch.isin(src, n_id)].unique()
+            n_id = torch.cat([n_id, frontier])
+
+        src, dst = torch.cat(srcs), torch.cat(dsts)
+
+        # Normalize with full-graph degrees so a node's output does not depend on
+        # which batch it lands in; sampled neighborhoods are rescaled to the full
+        # in-degree. Every node is the target of at most one sampling hop.
+        in_degree = self.graph.in_degree()
+        sampled_degree = torch.bincount(dst, minlength=self.graph.num_nodes)
+        edge_weight = self.graph.gcn_weight(src, dst) * in_degree[dst] / sampled_degree[dst]
+        loop_weight = self.graph.gcn_weight(n_id, n_id)
+
+        # Relabel global node indices to subgraph positions, seeds first
+        mapping = torch.full((self.graph.num_nodes,), -1, dtype=torch.long)
+        mapping[n_id] = torch.arange(n_id.numel())
+        loops = torch.arange(n_id.numel())
+        edge_index = torch.stack([
+            torch.cat([mapping[src], loops]),
+            torch.cat([mapping[dst], loops])
+        ])
+        return n_id, edge_index, torch.cat([edge_weight, loop_weight])
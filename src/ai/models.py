@@ -3,7 +3,9 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from torch_geometric.nn import GCNConv, global_mean_pool
+from torch_geometric.nn.conv.gcn_conv import gcn_norm
 from transformers import AutoModel, AutoTokenizer
+from .graph import AgentGraph, SampledGraphInference
 
 class PricePredictor(nn.Module):
     def __init__(self, input_dim: int, hidden_dim: int, output_dim: int):
@@ -20,14 +22,25 @@ class PricePredictor(nn.Module):
 class BehaviorAnalyzer(nn.Module):
     def __init__(self, node_features: int, hidden_channels: int):
         super(BehaviorAnalyzer, self).__init__()
-        self.conv1 = GCNConv(node_features, hidden_channels)
-        self.conv2 = GCNConv(hidden_channels, hidden_channels)
+        self.num_layers = 2
+        self.hidden_channels = hidden_channels
+        # Normalization happens once in embed() so callers can supply precomputed weights
+        self.conv1 = GCNConv(node_features, hidden_channels, normalize=False)
+        self.conv2 = GCNConv(hidden_channels, hidden_channels, normalize=False)
         self.fc = nn.Linear(hidden_channels, 1)
     
     def forward(self, x: torch.Tensor, edge_index: torch.Tensor, batch: torch.Tensor) -> torch.Tensor:
-        x = F.relu(self.conv1(x, edge_index))
+        return self.readout(self.embed(x, edge_index), batch)
+
+    def embed(self, x: torch.Tensor, edge_index: torch.Tensor,
+              edge_weight: Optional[torch.Tensor] = None) -> torch.Tensor:
+        if edge_weight is None:
+            edge_index, edge_weight = gcn_norm(edge_index, None, x.size(0), add_self_loops=True, dtype=x.dtype)
+        x = F.relu(self.conv1(x, edge_index, edge_weight))
         x = F.dropout(x, p=0.5, training=self.training)
-        x = self.conv2(x, edge_index)
+        return self.conv2(x, edge_index, edge_weight)
+
+    def readout(self, x: torch.Tensor, batch: torch.Tensor) -> torch.Tensor:
         x = global_mean_pool(x, batch)
         return torch.sigmoid(self.fc(x))
 
@@ -48,6 +61,7 @@ class RiskAssessor(nn.Module):
 
 class ModelManager:
     def __init__(self, config: Dict):
+        self.config = config
         self.price_predictor = PricePredictor(
             input_dim=config['price_input_dim'],
             hidden_dim=config['price_hidden_dim'],
@@ -67,6 +81,14 @@ class ModelManager:
     
     def analyze_behavior(self, x: torch.Tensor, edge_index: torch.Tensor, batch: torch.Tensor) -> torch.Tensor:
         return self.behavior_analyzer(x, edge_index, batch)
+
+    def create_behavior_inference(self, graph: AgentGraph) -> SampledGraphInference:
+        return SampledGraphInference(
+            self.behavior_analyzer,
+            graph,
+            fanouts=self.config.get('behavior_fanouts', (15, 10)),
+            batch_size=self.config.get('behavior_batch_size', 1024)
+        )
     
     def assess_risk(self, features: torch.Tensor) -> torch.Tensor:
         return self.risk_assessor(features)
\ No newline at end of file
@@ -1,9 +1,17 @@
+import contextlib
+import logging
+import os
+import numpy as np
 import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
 import torch.nn as nn
-from torch.utils.data import DataLoader
-from transformers import AutoModel, AutoTokenizer
-from typing import List, Dict, Any
-from .models import ProtocolAnalyzer
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader, Dataset, Sampler
+from typing import Callable, Iterator, List, Dict, Any, Optional, Sequence
+from .checkpoint import AsyncCheckpointer, capture_rng_state, restore_rng_state
+
+logger = logging.getLogger(__name__)
 
 class TrainingConfig:
     def __init__(
@@ -11,69 +19,353 @@ class TrainingConfig:
         batch_size: int = 32,
         learning_rate: float = 1e-4,
         epochs: int = 10,
-        device: str = 'cuda' if torch.cuda.is_available() else 'cpu'
+        device: str = 'cuda' if torch.cuda.is_available() else 'cpu',
+        num_workers: Optional[int] = None,
+        prefetch_factor: int = 4,
+        pin_memory: bool = torch.cuda.is_available(),
+        log_interval: int = 100,
+        world_size: int = 1,
+        gradient_accumulation_steps: int = 1,
+        threads_per_worker: Optional[int] = None,
+        dist_backend: str = 'gloo',
+        master_addr: str = '127.0.0.1',
+        master_port: int = 29500,
+        checkpoint_dir: Optional[str] = None,
+        checkpoint_interval: int = 0,
+        keep_checkpoints: int = 2,
+        autocast_dtype: Optional[torch.dtype] = None,
+        seed: int = 0
     ):
         self.batch_size = batch_size
         self.learning_rate = learning_rate
         self.epochs = epochs
         self.device = device
+        self.prefetch_factor = prefetch_factor
+        self.pin_memory = pin_memory
+        self.log_interval = log_interval
+        self.world_size = world_size
+        self.gradient_accumulation_steps = gradient_accumulation_steps
+        # Loader processes and compute threads share each rank's slice of the cores
+        cores_per_rank = max(1, (os.cpu_count() or 1) // world_size)
+        self.num_workers = min(8, cores_per_rank // 2) if num_workers is None else num_workers
+        self.threads_per_worker = threads_per_worker or max(1, cores_per_rank - self.num_workers)
+        self.dist_backend = dist_backend
+        self.master_addr = master_addr
+        self.master_port = master_port
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_interval = checkpoint_interval
+        self.keep_checkpoints = keep_checkpoints
+        self.autocast_dtype = autocast_dtype
+        self.seed = seed
+
+class MemmapDataset(Dataset):
+    """Batch-indexed dataset over the `.npy` files written by `DataProcessor.prepare_training_data`"""
+    def __init__(self, directory: str):
+        self.features_path = os.path.join(directory, 'features.npy')
+        self.labels_path = os.path.join(directory, 'labels.npy')
+        self._features: Optional[np.ndarray] = None
+        self._labels: Optional[np.ndarray] = None
+        # Only the header is read here; each worker maps the files itself
+        self._length = len(np.load(self.labels_path, mmap_mode='r'))
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, indices: Sequence[int]) -> Dict[str, torch.Tensor]:
+        if self._features is None:
+            self._features = np.load(self.features_path, mmap_mode='r')
+            self._labels = np.load(self.labels_path, mmap_mode='r')
+
+        # Sorted fancy indexing turns a random batch into mostly forward page reads
+        indices = np.sort(np.asarray(indices))
+        return {
+            'features': torch.from_numpy(np.ascontiguousarray(self._features[indices])),
+            'labels': torch.from_numpy(np.ascontiguousarray(self._labels[indices]))
+        }
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        state['_features'] = state['_labels'] = None
+        return state
+
+class ResumableBatchSampler(Sampler):
+    """Deterministic, rank-sharded batch sampler that can start mid-epoch.
+
+    The order of an epoch depends only on `seed` and the epoch number, so a run
+    restored to (epoch, batch offset) sees exactly the batches it had left.
+    """
+    def __init__(self, num_samples: int, batch_size: int, shuffle: bool = True, seed: int = 0,
+                 rank: int = 0, world_size: int = 1):
+        self.num_samples = num_samples
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.rank = rank
+        self.world_size = world_size
+        self.epoch = 0
+        self.start = 0
+        # Pad so every rank gets the same number of samples, like DistributedSampler
+        self.samples_per_rank = -(-num_samples // world_size)
+
+    def set_epoch(self, epoch: int, start: int = 0) -> None:
+        self.epoch = epoch
+        self.start = start
+
+    def __iter__(self) -> Iterator[List[int]]:
+        if self.shuffle:
+            generator = torch.Generator()
+            generator.manual_seed(self.seed + self.epoch)
+            order = torch.randperm(self.num_samples, generator=generator)
+        else:
+            order = torch.arange(self.num_samples)
+        padding = self.samples_per_rank * self.world_size - self.num_samples
+        if padding:
+            order = torch.cat([order, order[:padding]])
+        indices = order[self.rank::self.world_size]
+
+        for begin in range(self.start * self.batch_size, len(indices), self.batch_size):
+            yield indices[begin:begin + self.batch_size].tolist()
+
+    def __len__(self) -> int:
+        return -(-self.samples_per_rank // self.batch_size)
 
 class ModelTrainer:
-    def __init__(self, model: ProtocolAnalyzer, config: TrainingConfig):
-        self.model = model.to(config.device)
+    def __init__(self, model: nn.Module, config: TrainingConfig):
+        self.module = model.to(config.device)
         self.config = config
-        self.optimizer = torch.optim.Adam(model.parameters(), lr=config.learning_rate)
+        self.distributed = dist.is_available() and dist.is_initialized()
+        self.rank = dist.get_rank() if self.distributed else 0
+        self.model = DistributedDataParallel(self.module) if self.distributed else self.module
+        self.optimizer = torch.optim.Adam(self.module.parameters(), lr=config.learning_rate)
         self.criterion = nn.CrossEntropyLoss()
+        self.epoch = 0
+        self.step_in_epoch = 0
+        self.global_step = 0
+        self.checkpointer = None
+        if config.checkpoint_dir:
+            self.checkpointer = AsyncCheckpointer(
+                config.checkpoint_dir,
+                rank=self.rank,
+                world_size=dist.get_world_size() if self.distributed else 1,
+                keep=config.keep_checkpoints
+            )
+
+    @property
+    def is_main_process(self) -> bool:
+        return self.rank == 0
+
+    def create_dataloader(self, dataset: Dataset, shuffle: bool = True) -> DataLoader:
+        """Build a prefetching loader that yields whole batches from a batch-indexed dataset"""
+        sampler = ResumableBatchSampler(
+            len(dataset),
+            self.config.batch_size,
+            shuffle=shuffle,
+            seed=self.config.seed,
+            rank=self.rank,
+            world_size=dist.get_world_size() if self.distributed else 1
+        )
+        workers = self.config.num_workers
+        return DataLoader(
+            dataset,
+            sampler=sampler,
+            batch_size=None,
+            num_workers=workers,
+            pin_memory=self.config.pin_memory,
+            prefetch_factor=self.config.prefetch_factor if workers > 0 else None,
+            persistent_workers=workers > 0
+        )
 
     def train_epoch(self, dataloader: DataLoader) -> float:
         self.model.train()
-        total_loss = 0.0
+        epoch = self.epoch
+        start = self.step_in_epoch
+        self._set_sampler_epoch(dataloader, start)
+        accumulation = self.config.gradient_accumulation_steps
+        interval = self.config.checkpoint_interval
+        num_steps = len(dataloader)
+        # Loss stays on the device; it is only synchronized at log intervals
+        total_loss = torch.zeros((), device=self.config.device)
         
-        for batch in dataloader:
-            self.optimizer.zero_grad()
+        self.optimizer.zero_grad(set_to_none=True)
+        for step, batch in enumerate(dataloader, start + 1):
             inputs, labels = self._prepare_batch(batch)
-            outputs = self.model(inputs)
-            loss = self.criterion(outputs, labels)
-            loss.backward()
-            self.optimizer.step()
-            total_loss += loss.item()
+            boundary = step % accumulation == 0 or step == num_steps
+            # The last group of an epoch may hold fewer micro-batches
+            group_size = min(accumulation, num_steps - (step - 1) // accumulation * accumulation)
+            # Skip the gradient all-reduce on micro-batches that do not step
+            with self._gradient_sync(boundary):
+                with self._autocast():
+                    outputs = self.model(inputs)
+                    loss = self.criterion(outputs, labels)
+                (loss / group_size).backward()
+            total_loss += loss.detach().float()
+            self.step_in_epoch = step
 
-        return total_loss / len(dataloader)
+            if boundary:
+                self.optimizer.step()
+                self.optimizer.zero_grad(set_to_none=True)
+                self.global_step += 1
+                if step == num_steps:
+                    # A checkpoint taken here must resume at the start of the next epoch
+                    self.epoch += 1
+                    self.step_in_epoch = 0
+                if self.checkpointer and interval and self.global_step % interval == 0:
+                    self.save_checkpoint()
+
+            if self.config.log_interval and step % self.config.log_interval == 0 and self.is_main_process:
+                logger.info('epoch %d step %d: avg loss %.4f', epoch, step, total_loss.item() / (step - start))
+
+        if self.epoch == epoch:
+            # Nothing was left to run (e.g. an empty loader)
+            self.epoch += 1
+            self.step_in_epoch = 0
+        return self._all_reduce_mean(total_loss).item() / max(num_steps - start, 1)
 
     def evaluate(self, dataloader: DataLoader) -> Dict[str, float]:
         self.model.eval()
-        total_loss = 0.0
-        correct = 0
+        total_loss = torch.zeros((), device=self.config.device)
+        correct = torch.zeros((), dtype=torch.long, device=self.config.device)
         total = 0
 
         with torch.no_grad():
             for batch in dataloader:
                 inputs, labels = self._prepare_batch(batch)
-                outputs = self.model(inputs)
-                loss = self.criterion(outputs, labels)
-                total_loss += loss.item()
+                with self._autocast():
+                    outputs = self.model(inputs)
+                    loss = self.criterion(outputs, labels)
+                total_loss += loss.float()
 
                 _, predicted = torch.max(outputs.data, 1)
                 total += labels.size(0)
-                correct += (predicted == labels).sum().item()
+                correct += (predicted == labels).sum()
+
+        if self.distributed:
+            total = torch.tensor(total, device=self.config.device)
+            dist.all_reduce(correct)
+            dist.all_reduce(total)
+            total = total.item()
 
         return {
-            'loss': total_loss / len(dataloader),
-            'accuracy': correct / total
+            'loss': self._all_reduce_mean(total_loss).item() / len(dataloader),
+            'accuracy': correct.item() / total
         }
 
     def _prepare_batch(self, batch: Dict[str, torch.Tensor]) -> tuple:
-        inputs = {k: v.to(self.config.device) for k, v in batch.items() if k != 'labels'}
-        labels = batch['labels'].to(self.config.device)
+        # Pinned host batches let these copies overlap with compute
+        non_blocking = self.config.pin_memory
+        inputs = {k: v.to(self.config.device, non_blocking=non_blocking) for k, v in batch.items() if k != 'labels'}
+        labels = batch['labels'].to(self.config.device, non_blocking=non_blocking)
         return inputs, labels
 
+    def _set_sampler_epoch(self, dataloader: DataLoader, start: int = 0):
+        sampler = dataloader.sampler
+        if isinstance(sampler, ResumableBatchSampler):
+            sampler.set_epoch(self.epoch, start)
+        elif start:
+            raise ValueError('Resuming mid-epoch requires a loader from create_dataloader')
+
+    def _autocast(self):
+        dtype = self.config.autocast_dtype
+        if dtype is None:
+            return contextlib.nullcontext()
+        return torch.autocast(device_type=torch.device(self.config.device).type, dtype=dtype)
+
+    def _gradient_sync(self, enabled: bool):
+        if self.distributed and not enabled:
+            return self.model.no_sync()
+        return contextlib.nullcontext()
+
+    def _all_reduce_mean(self, value: torch.Tensor) -> torch.Tensor:
+        if not self.distributed:
+            return value
+        value = value.clone()
+        dist.all_reduce(value)
+        return value / dist.get_world_size()
+
     def save_model(self, path: str):
-        torch.save({
-            'model_state_dict': self.model.state_dict(),
-            'optimizer_state_dict': self.optimizer.state_dict(),
-        }, path)
+        # Replicas are identical, so only rank 0 writes; the others wait for the file
+        if self.is_main_process:
+            torch.save({
+                'model_state_dict': self.module.state_dict(),
+                'optimizer_state_dict': self.optimizer.state_dict(),
+                'epoch': self.epoch,
+            }, path)
+        if self.distributed:
+            dist.barrier()
 
     def load_model(self, path: str):
-        checkpoint = torch.load(path)
-        self.model.load_state_dict(checkpoint['model_state_dict'])
-        self.optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
\ No newline at end of file
+        checkpoint = torch.load(path, map_location=self.config.device)
+        self.module.load_state_dict(checkpoint['model_state_dict'])
+        self.optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
+        self.epoch = checkpoint.get('epoch', 0)
+
+    def save_checkpoint(self):
+        """Queue an asynchronous step checkpoint; training continues while it is written"""
+        shards = {
+            f'trainer.rank{self.rank}': {
+                'epoch': self.epoch,
+                'step_in_epoch': self.step_in_epoch,
+                'global_step': self.global_step,
+                'rng_state': capture_rng_state(),
+            }
+        }
+        if self.is_main_process:
+            shards['model'] = self.module.state_dict()
+            shards['optimizer'] = self.optimizer.state_dict()
+        self.checkpointer.save(self.global_step, shards)
+
+    def resume_from_checkpoint(self) -> bool:
+        """Restore the newest complete step checkpoint, if there is one"""
+        path = self.checkpointer.latest() if self.checkpointer else None
+        if path is None:
+            return False
+
+        self.module.load_state_dict(self.checkpointer.load(path, 'model'))
+        self.optimizer.load_state_dict(self.checkpointer.load(path, 'optimizer'))
+        state = self.checkpointer.load(path, f'trainer.rank{self.rank}')
+        self.epoch = state['epoch']
+        self.step_in_epoch = state['step_in_epoch']
+        self.global_step = state['global_step']
+        restore_rng_state(state['rng_state'])
+        return True
+
+def _distributed_worker(rank: int, model_factory: Callable[[], nn.Module], data_dir: str,
+                        config: TrainingConfig, checkpoint_path: Optional[str]):
+    os.environ['MASTER_ADDR'] = config.master_addr
+    os.environ['MASTER_PORT'] = str(config.master_port)
+    # Give each replica its own slice of cores instead of oversubscribing them
+    torch.set_num_threads(config.threads_per_worker)
+    torch.set_num_interop_threads(1)
+    dist.init_process_group(config.dist_backend, rank=rank, world_size=config.world_size)
+
+    try:
+        trainer = ModelTrainer(model_factory(), config)
+        if not trainer.resume_from_checkpoint() and checkpoint_path and os.path.exists(checkpoint_path):
+            trainer.load_model(checkpoint_path)
+        dataloader = trainer.create_dataloader(MemmapDataset(data_dir))
+
+        while trainer.epoch < config.epochs:
+            loss = trainer.train_epoch(dataloader)
+            if trainer.is_main_process:
+                logger.info('epoch %d: loss %.4f', trainer.epoch, loss)
+            if checkpoint_path:
+                trainer.save_model(checkpoint_path)
+        if trainer.checkpointer:
+            trainer.checkpointer.close()
+    finally:
+        dist.destroy_process_group()
+
+def train_distributed(model_factory: Callable[[], nn.Module], data_dir: str, config: TrainingConfig,
+                      checkpoint_path: Optional[str] = None):
+    """Train `config.world_size` data-parallel replicas in local worker processes.
+
+    `model_factory` must be picklable (e.g. a module-level function). Training
+    resumes from the newest step checkpoint in `config.checkpoint_dir`, falling
+    back to `checkpoint_path`, which is rewritten after every epoch.
+    """
+    mp.spawn(
+        _distributed_worker,
+        args=(model_factory, data_dir, config, checkpoint_path),
+        nprocs=config.world_size,
+        join=True
+    )
\ No newline at end of file
@@ -1,14 +1,97 @@
+import os
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
+from numpy.lib.stride_tricks import sliding_window_view
 from sklearn.preprocessing import StandardScaler
 from .pipeline import DataPipeline
 
+def _rolling_mean_std(values: np.ndarray, window: int,
+                      block_elements: int = 1 << 16) -> Tuple[np.ndarray, np.ndarray]:
+    """Trailing-window mean and sample std, NaN until the window is full.
+
+    Each window is reduced on its own, so the result for a row depends only
+    on that row's window and not on how the series was split into chunks.
+    Windows are reduced in blocks so the temporaries stay near `block_elements`
+    values however long the series is.
+    """
+    mean = np.full(len(values), np.nan)
+    std = np.full(len(values), np.nan)
+    if len(values) >= window:
+        windows = sliding_window_view(values, window)
+        block = max(1, block_elements // window)
+        for start in range(0, len(windows), block):
+            chunk = windows[start:start + block]
+            rows = slice(window - 1 + start, window - 1 + start + len(chunk))
+            mean[rows] = chunk.mean(axis=1)
+            std[rows] = chunk.std(axis=1, ddof=1)
+    return mean, std
+
+class IncrementalFeatureExtractor:
+    """Extract protocol features for appended rows only.
+
+    Keeps the rolling-window tail, the known protocol categories and the last
+    timestamp, so feeding a frame in chunks yields the same rows as feeding it
+    at once (with protocol columns first seen later filled with False). Chunks
+    that start before the last timestamp are rejected.
+    """
+    def __init__(self, window: int = 10):
+        self.window = window
+        self.protocol_categories: List[Any] = []
+        self.packet_size_tail = np.empty(0)
+        self.last_timestamp: Optional[pd.Timestamp] = None
+
+    @property
+    def protocol_columns(self) -> List[str]:
+        return [f'protocol_{category}' for category in self.protocol_categories]
+
+    def update(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Compute features for the rows of df, which follow all rows seen so far."""
+        timestamps = pd.to_datetime(df['timestamp']) if 'timestamp' in df.columns else None
+        if timestamps is not None and self.last_timestamp is not None and timestamps.min() < self.last_timestamp:
+            # An out-of-order chunk would be windowed against the wrong tail
+            raise ValueError(f'Appended rows start at {timestamps.min()}, before {self.last_timestamp}')
+
+        features = pd.DataFrame(index=df.index)
+
+        # Time-based features
+        if timestamps is not None:
+            features['hour'] = timestamps.dt.hour
+            features['day_of_week'] = timestamps.dt.dayofweek
+            if timestamps.notna().any():
+                self.last_timestamp = timestamps.max()
+
+        # Protocol-specific features
+        if 'protocol_type' in df.columns:
+            # One-hot encode against every protocol type seen so far
+            seen = set(self.protocol_categories)
+            new = [p for p in df['protocol_type'].dropna().unique() if p not in seen]
+            if new:
+                self.protocol_categories = sorted(self.protocol_categories + new)
+            protocol_dummies = pd.get_dummies(
+                pd.Categorical(df['protocol_type'], categories=self.protocol_categories),
+                prefix='protocol'
+            )
+            protocol_dummies.index = df.index
+            features = pd.concat([features, protocol_dummies], axis=1)
+
+        # Statistical features
+        if 'packet_size' in df.columns:
+            sizes = np.concatenate([self.packet_size_tail, df['packet_size'].to_numpy(dtype=float)])
+            mean, std = _rolling_mean_std(sizes, self.window)
+            tail_length = len(self.packet_size_tail)
+            features['avg_packet_size'] = mean[tail_length:]
+            features['packet_size_std'] = std[tail_length:]
+            self.packet_size_tail = sizes[len(sizes) - (self.window - 1):] if self.window > 1 else sizes[:0]
+
+        return features
+
 class DataProcessor:
     def __init__(self, config: Dict[str, Any] = None):
         self.config = config or {}
         self.scaler = StandardScaler()
-        self.pipeline = DataPipeline()
+        self.pipeline = DataPipeline(self.config.get('pipeline', {}))
+        self.feature_extractor = IncrementalFeatureExtractor(self.config.get('rolling_window', 10))
 
     def preprocess_protocol_data(self, raw_data: List[Dict[str, Any]]) -> pd.DataFrame:
         """Preprocess raw protocol data into structured format."""
@@ -51,23 +134,13 @@ class DataProcessor:
 
     def _extract_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """Extract relevant features from cleaned data."""
-        features = pd.DataFrame()
-        
-        # Time-based features
-        if 'timestamp' in df.columns:
-            features['hour'] = pd.to_datetime(df['timestamp']).dt.hour
-            features['day_of_week'] = pd.to_datetime(df['timestamp']).dt.dayofweek
-        
-        # Protocol-specific features
-        if 'protocol_type' in df.columns:
-            # One-hot encode protocol types
-            protocol_dummies = pd.get_dummies(df['protocol_type'], prefix='protocol')
-            features = pd.concat([features, protocol_dummies], axis=1)
-        
-        # Statistical features
-        if 'packet_size' in df.columns:
-            features['avg_packet_size'] = df['packet_size'].rolling(window=10).mean()
-            features['packet_size_std'] = df['packet_size'].rolling(window=10).std()
+        # Start a fresh extractor so later appends continue from this history
+        self.feature_extractor = IncrementalFeatureExtractor(self.feature_extractor.window)
+        return self.extract_new_features(df)
+
+    def extract_new_features(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Extract features for rows appended after the data already processed."""
+        features = self.feature_extractor.update(df)
         
         # Add custom features through pipeline
         pipeline_features = self.pipeline.process(df)
@@ -75,12 +148,25 @@ class DataProcessor:
         
         return features
 
-    def prepare_training_data(self, features: pd.DataFrame, labels: List[int]) -> Tuple[np.ndarray, np.ndarray]:
-        """Prepare features and labels for model training."""
-        X = features.values
-        y = np.array(labels)
-        
-        return X, y
+    def prepare_training_data(self, features: pd.DataFrame, labels: List[int],
+                              output_dir: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Prepare features and labels for model training.
+
+        When `output_dir` is given, the arrays are written as `features.npy` and
+        `labels.npy` and returned as read-only memory maps of those files.
+        """
+        if output_dir is None:
+            X = features.values
+            y = np.array(labels)
+            return X, y
+
+        os.makedirs(output_dir, exist_ok=True)
+        features_path = os.path.join(output_dir, 'features.npy')
+        labels_path = os.path.join(output_dir, 'labels.npy')
+        np.save(features_path, np.ascontiguousarray(features.values, dtype=np.float32))
+        np.save(labels_path, np.asarray(labels, dtype=np.int64))
+
+        return np.load(features_path, mmap_mode='r'), np.load(labels_path, mmap_mode='r')
 
     def save_processor_state(self, path: str):
         """Save processor state including scaler parameters."""
@@ -1,15 +1,17 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Hashable, Optional, Tuple
 from abc import ABC, abstractmethod
 import numpy as np
 from datetime import datetime
-from .base import BaseProtocol
+from .base import Protocol
+from .baseline import BaselineStore
+from .cache import MetricCache
 
 class ProtocolAnalyzer(ABC):
     """Abstract base class for protocol analysis."""
     
     def __init__(self, config: Optional[Dict[str, Any]] = None):
         self.config = config or {}
-        self.protocols: Dict[str, BaseProtocol] = {}
+        self.protocols: Dict[str, Protocol] = {}
 
     @abstractmethod
     def analyze_packet(self, packet_data: bytes) -> Dict[str, Any]:
@@ -27,31 +29,48 @@ class MCPAnalyzer(ProtocolAnalyzer):
     def __init__(self, config: Optional[Dict[str, Any]] = None):
         super().__init__(config)
         self.packet_history: List[Dict[str, Any]] = []
-        self.anomaly_threshold = config.get('anomaly_threshold', 0.95)
-
-    def analyze_packet(self, packet_data: bytes) -> Dict[str, Any]:
+        self.anomaly_threshold = self.config.get('anomaly_threshold', 0.95)
+        self.per_flow_baselines = self.config.get('per_flow_baselines', False)
+        self.baselines = BaselineStore(
+            window=self.config.get('baseline_window', 100),
+            max_baselines=self.config.get('max_baselines', 10000),
+            idle_timeout=self.config.get('baseline_idle_timeout', 300.0)
+        )
+        # Optional memoization of per-packet results for byte-identical packets
+        self.metric_cache: Optional[MetricCache] = None
+        if self.config.get('metric_cache', False):
+            self.metric_cache = MetricCache(self.config.get('metric_cache_bytes', 16 * 1024 * 1024))
+
+    def analyze_packet(self, packet_data: bytes, flow_id: Optional[Hashable] = None) -> Dict[str, Any]:
         # Basic packet analysis
+        protocol_type, structure, metrics = self._packet_results(packet_data)
         analysis = {
             'timestamp': datetime.now().isoformat(),
             'size': len(packet_data),
-            'protocol_type': self._identify_protocol(packet_data),
-            'structure': self._analyze_structure(packet_data),
-            'metrics': self._calculate_metrics(packet_data)
+            'protocol_type': protocol_type,
+            'structure': structure,
+            'metrics': metrics
         }
+        if flow_id is not None:
+            analysis['flow_id'] = flow_id
         
         # Update history
         self.packet_history.append(analysis)
         if len(self.packet_history) > 1000:  # Keep history bounded
             self.packet_history.pop(0)
+
+        # Update the baseline this packet is judged against
+        self.baselines.update(self._baseline_key(analysis), analysis['metrics'])
             
         return analysis
 
-    def detect_anomalies(self, packet_sequence: List[bytes]) -> List[Dict[str, Any]]:
+    def detect_anomalies(self, packet_sequence: List[bytes],
+                         flow_id: Optional[Hashable] = None) -> List[Dict[str, Any]]:
         anomalies = []
         
         for i, packet in enumerate(packet_sequence):
             # Analyze current packet
-            current_analysis = self.analyze_packet(packet)
+            current_analysis = self.analyze_packet(packet, flow_id)
             
             # Compare with historical patterns
             if self._is_anomalous(current_analysis):
@@ -64,6 +83,26 @@ class MCPAnalyzer(ProtocolAnalyzer):
         
         return anomalies
 
+    def _packet_results(self, packet_data: bytes) -> Tuple[str, Dict[str, Any], Dict[str, float]]:
+        """Identify, parse and measure a packet, reusing cached results for repeats."""
+        if self.metric_cache is None:
+            return (self._identify_protocol(packet_data),
+                    self._analyze_structure(packet_data),
+                    self._calculate_metrics(packet_data))
+
+        key = self.metric_cache.digest(packet_data)
+        # The bytes are compared on a hit, so digest collisions cannot reuse results
+        cached = self.metric_cache.get(key, packet_data)
+        if cached is None:
+            cached = (self._identify_protocol(packet_data),
+                      self._analyze_structure(packet_data),
+                      self._calculate_metrics(packet_data))
+            self.metric_cache.put(key, cached, packet_data)
+
+        # Hand out copies so callers cannot mutate the cached entry
+        protocol_type, structure, metrics = cached
+        return protocol_type, dict(structure), dict(metrics)
+
     def _identify_protocol(self, packet_data: bytes) -> str:
         """Identify the protocol type from packet data."""
         # Protocol identification logic
@@ -100,24 +139,22 @@ class MCPAnalyzer(ProtocolAnalyzer):
 
     def _is_anomalous(self, analysis: Dict[str, Any]) -> bool:
         """Determine if the analyzed packet is anomalous."""
-        if not self.packet_history:
+        baseline = self.baselines.get(self._baseline_key(analysis))
+        if baseline is None:
             return False
             
-        # Compare metrics with historical averages
-        historical_metrics = [h['metrics'] for h in self.packet_history[-100:]]
-        current_metrics = analysis['metrics']
-        
-        # Calculate z-scores for each metric
-        z_scores = {}
-        for metric in current_metrics:
-            historical_values = [h[metric] for h in historical_metrics]
-            mean = np.mean(historical_values)
-            std = np.std(historical_values) or 1.0  # Avoid division by zero
-            z_scores[metric] = abs((current_metrics[metric] - mean) / std)
+        # Compare metrics with the running averages of the packet's own protocol/flow
+        z_scores = baseline.z_scores(analysis['metrics'])
         
         # Consider it anomalous if any z-score exceeds threshold
         return any(z > self.anomaly_threshold for z in z_scores.values())
 
+    def _baseline_key(self, analysis: Dict[str, Any]) -> Tuple[Hashable, ...]:
+        """Key baselines by protocol type, and by flow when enabled."""
+        if self.per_flow_baselines and 'flow_id' in analysis:
+            return (analysis['protocol_type'], analysis['flow_id'])
+        return (analysis['protocol_type'],)
+
     def _get_anomaly_details(self, analysis: Dict[str, Any]) -> Dict[str, Any]:
         """Get detailed information about detected anomaly."""
         return {
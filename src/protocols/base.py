@@ -1,7 +1,17 @@
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional
+from collections import deque
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 import asyncio
 import json
+import logging
+from .lifecycle import StartupGraph
+from .pool import ConnectionPool
+from .registry import ShardedAgentRegistry
+
+if TYPE_CHECKING:
+    from .transport import ShmTransport
+
+logger = logging.getLogger(__name__)
 
 class Protocol(ABC):
     """Base class for all protocols"""
@@ -20,20 +30,105 @@ class ModelContextProtocol(Protocol):
     def __init__(self, config: Dict[str, Any]):
         self.config = config
         self.models = {}
-        self.data_sources = {}
+        self.data_sources: Dict[str, ConnectionPool] = {}
         self.active_contexts = {}
+        self._model_loaders: Dict[str, Dict[str, Any]] = {}
+        self._startup: Optional[StartupGraph] = None
+
+    def register_data_source(
+        self,
+        name: str,
+        connect: Callable[[], Awaitable[Any]],
+        health_check: Optional[Callable[[Any], Awaitable[bool]]] = None,
+        close: Optional[Callable[[Any], Awaitable[None]]] = None
+    ) -> ConnectionPool:
+        """Register a pooled data source; sizes come from config['data_sources'][name]"""
+        pool_config = self.config.get('data_sources', {}).get(name, {})
+        pool = ConnectionPool(
+            connect,
+            min_size=pool_config.get('min_size', 1),
+            max_size=pool_config.get('max_size', 10),
+            health_check=health_check,
+            close=close,
+            acquire_timeout=pool_config.get('acquire_timeout')
+        )
+        self.data_sources[name] = pool
+        return pool
+
+    def register_model(
+        self,
+        name: str,
+        load: Callable[[], Awaitable[Any]],
+        depends_on: Iterable[str] = (),
+        unload: Optional[Callable[[Any], Awaitable[None]]] = None
+    ) -> None:
+        """Register a model loader and the data sources or models it needs first"""
+        self._model_loaders[name] = {'load': load, 'depends_on': list(depends_on), 'unload': unload}
+
+    def add_startup_steps(self, graph: StartupGraph, prefix: str = 'mcp') -> None:
+        """Add data source, model and context steps to a startup graph"""
+        def node(kind: str, name: str) -> str:
+            return f'{prefix}.{kind}.{name}'
+
+        for name, pool in self.data_sources.items():
+            graph.add(node('data_source', name), pool.open, stop=pool.close)
+
+        for name, loader in self._model_loaders.items():
+            depends_on = []
+            for dep in loader['depends_on']:
+                if dep in self.data_sources:
+                    depends_on.append(node('data_source', dep))
+                elif dep in self._model_loaders:
+                    depends_on.append(node('model', dep))
+                else:
+                    raise ValueError(f'Model {name} depends on unknown resource {dep}')
+            graph.add(node('model', name), self._model_starter(name), depends_on,
+                      stop=self._model_stopper(name))
+
+        # Contexts close first on shutdown, before the models they use
+        graph.add(f'{prefix}.contexts', self._initialize_contexts,
+                  [node('model', name) for name in self._model_loaders],
+                  stop=self._cleanup_contexts)
 
     async def initialize(self) -> None:
         """Initialize MCP resources and connections"""
-        await self._setup_data_sources()
-        await self._load_models()
-        await self._initialize_contexts()
+        graph = StartupGraph()
+        self.add_startup_steps(graph)
+        await graph.start()
+        self._startup = graph
 
     async def shutdown(self) -> None:
         """Clean up MCP resources"""
-        await self._cleanup_contexts()
-        await self._unload_models()
-        await self._close_data_sources()
+        if self._startup is not None:
+            await self._startup.stop()
+            self._startup = None
+
+    def data_source(self, name: str):
+        """Borrow a pooled connection: `async with mcp.data_source(name) as conn`"""
+        if name not in self.data_sources:
+            raise ValueError(f'Data source {name} not found')
+        return self.data_sources[name].connection()
+
+    def _model_starter(self, name: str) -> Callable[[], Awaitable[None]]:
+        async def start() -> None:
+            self.models[name] = await self._model_loaders[name]['load']()
+        return start
+
+    def _model_stopper(self, name: str) -> Callable[[], Awaitable[None]]:
+        async def stop() -> None:
+            model = self.models.pop(name, None)
+            unload = self._model_loaders[name]['unload']
+            if unload is not None and model is not None:
+                await unload(model)
+        return stop
+
+    async def _initialize_contexts(self) -> None:
+        self.active_contexts = {}
+
+    async def _cleanup_contexts(self) -> None:
+        for context in self.active_contexts.values():
+            context['status'] = 'closed'
+        self.active_contexts = {}
 
     async def create_context(self, context_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new model context"""
@@ -59,9 +154,13 @@ class AgentToAgentProtocol(Protocol):
     """Implementation of Agent-to-Agent (A2A) Protocol"""
     def __init__(self, config: Dict[str, Any]):
         self.config = config
-        self.agents = {}
+        self.agents = ShardedAgentRegistry(
+            num_shards=config.get('num_shards', 16),
+            local_shards=config.get('local_shards')
+        )
         self.connections = {}
-        self.message_queue = asyncio.Queue()
+        self.transport: Optional['ShmTransport'] = None
+        self._shard_owner: Callable[[int], int] = lambda shard: shard
 
     async def initialize(self) -> None:
         """Initialize A2A resources and agent network"""
@@ -88,15 +187,112 @@ class AgentToAgentProtocol(Protocol):
 
     async def send_message(self, from_agent: str, to_agent: str, message: Dict[str, Any]) -> None:
         """Send a message between agents"""
-        if from_agent not in self.agents or to_agent not in self.agents:
-            raise ValueError('Invalid agent ID')
+        self._validate_route(from_agent, to_agent)
         
-        await self.message_queue.put({
+        self.agents.deliver({
             'from': from_agent,
             'to': to_agent,
             'content': message,
             'timestamp': asyncio.get_event_loop().time()
         })
+        if self.transport is not None and self.agents.outbound:
+            await self.flush_outbound()
+
+    async def send_many(self, messages: Iterable[Tuple[str, str, Dict[str, Any]]]) -> int:
+        """Send a batch of (from_agent, to_agent, message) tuples"""
+        timestamp = asyncio.get_event_loop().time()
+        envelopes = []
+        for from_agent, to_agent, message in messages:
+            self._validate_route(from_agent, to_agent)
+            envelopes.append({
+                'from': from_agent,
+                'to': to_agent,
+                'content': message,
+                'timestamp': timestamp
+            })
+
+        self.agents.deliver_many(envelopes)
+        if self.transport is not None and self.agents.outbound:
+            await self.flush_outbound()
+        return len(envelopes)
+
+    async def receive(self, agent_id: str) -> Dict[str, Any]:
+        """Wait for the next message addressed to an agent"""
+        return await self.agents.mailbox(agent_id).get()
+
+    async def receive_many(self, agent_id: str, max_messages: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Take the messages already waiting for an agent"""
+        return self.agents.mailbox(agent_id).drain(max_messages)
+
+    def attach_transport(self, transport: 'ShmTransport',
+                         shard_owner: Optional[Callable[[int], int]] = None) -> None:
+        """Carry messages for non-local shards over a shared-memory transport.
+
+        `shard_owner` maps a shard to the process that holds it (by default
+        `shard % num_processes`) and must agree with this process's `local_shards`.
+        """
+        owner = shard_owner or (lambda shard: shard % transport.num_processes)
+        for shard in range(self.agents.num_shards):
+            process_id = owner(shard)
+            if not 0 <= process_id < transport.num_processes:
+                raise ValueError(f'Shard {shard} is owned by unknown process {process_id}')
+            if (process_id == transport.process_id) != (shard in self.agents.local_shards):
+                raise ValueError(f'Shard {shard} is owned by process {process_id}, which does not match '
+                                 f'local_shards of process {transport.process_id}')
+        self.transport = transport
+        self._shard_owner = owner
+
+    async def flush_outbound(self) -> int:
+        """Send queued messages for remote shards to the processes that own them.
+
+        If sending fails (or is cancelled), the messages that did not go out are
+        returned to the outbox before the error propagates.
+        """
+        by_process: Dict[int, List[Dict[str, Any]]] = {}
+        for shard, messages in self.agents.take_outbound().items():
+            by_process.setdefault(self._shard_owner(shard), []).extend(messages)
+
+        unsent: Deque[Dict[str, Any]] = deque()
+
+        def take_unsent() -> Iterator[Dict[str, Any]]:
+            # A message leaves `unsent` only once the transport asks for the next one
+            while unsent:
+                yield unsent[0]
+                unsent.popleft()
+
+        sent = 0
+        try:
+            for process_id in list(by_process):
+                unsent.extend(by_process.pop(process_id))
+                sent += await self.transport.send_many(process_id, take_unsent())
+        except BaseException:
+            self.agents.return_outbound([*unsent, *(m for messages in by_process.values() for m in messages)])
+            raise
+        return sent
+
+    async def pump_transport(self, max_messages: Optional[int] = None) -> int:
+        """Deliver messages that arrived from other processes to local mailboxes"""
+        # Imported here so platforms without POSIX shared memory can still use the protocols
+        from .transport import release_payloads
+
+        messages = []
+        for message in self.transport.poll(max_messages):
+            if message['to'] in self.agents:
+                messages.append(message)
+            else:
+                # Nobody here will read it, so free any payload blocks it carries
+                logger.warning('Dropping message from %s to unknown agent %s', message['from'], message['to'])
+                release_payloads(message['content'])
+        self.agents.deliver_many(messages)
+        return len(messages)
+
+    def _validate_route(self, from_agent: str, to_agent: str) -> None:
+        # Recipients on shards owned by other processes cannot be checked here
+        if from_agent not in self.agents or (self.agents.is_local(to_agent) and to_agent not in self.agents):
+            raise ValueError('Invalid agent ID')
+        if self.transport is None and not self.agents.is_local(to_agent):
+            raise RuntimeError(f'Agent {to_agent} is on non-local shard {self.agents.shard_for(to_agent)} '
+                               'and no transport is attached')
 
     async def get_agent_status(self, agent_id: str) -> Dict[str, Any]:
         """Get the current status of an agent"""
@@ -110,17 +306,23 @@ class ProtocolManager:
         self.config = config
         self.mcp = ModelContextProtocol(config.get('mcp', {}))
         self.a2a = AgentToAgentProtocol(config.get('a2a', {}))
+        self._startup: Optional[StartupGraph] = None
+
+    def build_startup_graph(self) -> StartupGraph:
+        """Build one graph so independent MCP and A2A resources start concurrently"""
+        graph = StartupGraph()
+        self.mcp.add_startup_steps(graph)
+        graph.add('a2a', self.a2a.initialize, stop=self.a2a.shutdown)
+        return graph
 
     async def initialize(self) -> None:
         """Initialize all protocol instances"""
-        await asyncio.gather(
-            self.mcp.initialize(),
-            self.a2a.initialize()
-        )
+        graph = self.build_startup_graph()
+        await graph.start()
+        self._startup = graph
 
     async def shutdown(self) -> None:
-        """Shutdown all protocol instances"""
-        await asyncio.gather(
-            self.mcp.shutdown(),
-            self.a2a.shutdown()
-        )
\ No newline at end of file
+        """Shutdown all protocol instances, draining dependents first"""
+        if self._startup is not None:
+            await self._startup.stop()
+            self._startup = None
\ No newline at end of file
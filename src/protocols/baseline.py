@@ -0,0 +1,107 @@
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Sequence, Tuple
+import time
+import numpy as np
+
+class RunningBaseline:
+    """Sliding-window mean and standard deviation with O(1) updates."""
+
+    def __init__(self, metric_names: Sequence[str], window: int = 100):
+        self.metric_names = tuple(metric_names)
+        self.window = window
+        self.values = np.zeros((window, len(self.metric_names)))
+        self.sums = np.zeros(len(self.metric_names))
+        self.sq_sums = np.zeros(len(self.metric_names))
+        self.count = 0
+        self.position = 0
+        self.last_seen = 0.0
+
+    def update(self, metrics: Dict[str, float]) -> None:
+        """Add one observation, dropping the oldest once the window is full."""
+        value = np.array([metrics[name] for name in self.metric_names], dtype=float)
+        if self.count == self.window:
+            old = self.values[self.position]
+            self.sums -= old
+            self.sq_sums -= old * old
+        else:
+            self.count += 1
+
+        self.values[self.position] = value
+        self.sums += value
+        self.sq_sums += value * value
+        self.position = (self.position + 1) % self.window
+
+        # Re-derive the running sums once per window to stop float drift
+        if self.position == 0:
+            filled = self.values[:self.count]
+            self.sums = filled.sum(axis=0)
+            self.sq_sums = (filled * filled).sum(axis=0)
+
+    def stats(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the window mean and (population) standard deviation."""
+        mean = self.sums / self.count
+        variance = np.maximum(self.sq_sums / self.count - mean * mean, 0.0)
+        return mean, np.sqrt(variance)
+
+    def z_scores(self, metrics: Dict[str, float]) -> Dict[str, float]:
+        """Calculate per-metric z-scores against the current window."""
+        mean, std = self.stats()
+        std = np.where(std > 0, std, 1.0)  # Avoid division by zero
+        return {
+            name: abs((metrics[name] - mean[i]) / std[i])
+            for i, name in enumerate(self.metric_names)
+        }
+
+class BaselineStore:
+    """Bounded, keyed collection of baselines with LRU and idle eviction."""
+
+    def __init__(self, window: int = 100, max_baselines: int = 10000,
+                 idle_timeout: Optional[float] = 300.0):
+        self.window = window
+        self.max_baselines = max_baselines
+        self.idle_timeout = idle_timeout
+        self.baselines: 'OrderedDict[Hashable, RunningBaseline]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.baselines)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.baselines
+
+    def get(self, key: Hashable) -> Optional[RunningBaseline]:
+        return self.baselines.get(key)
+
+    def update(self, key: Hashable, metrics: Dict[str, float],
+               now: Optional[float] = None) -> RunningBaseline:
+        """Fold metrics into the baseline for key, creating it if needed."""
+        now = time.monotonic() if now is None else now
+        self.evict_idle(now)
+
+        baseline = self.baselines.get(key)
+        if baseline is None:
+            baseline = RunningBaseline(list(metrics), self.window)
+            self.baselines[key] = baseline
+            if len(self.baselines) > self.max_baselines:
+                self.baselines.popitem(last=False)
+        else:
+            self.baselines.move_to_end(key)
+
+        baseline.last_seen = now
+        baseline.update(metrics)
+        return baseline
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Drop baselines that have not been updated within idle_timeout."""
+        if self.idle_timeout is None:
+            return 0
+
+        now = time.monotonic() if now is None else now
+        evicted = 0
+        # Entries are kept in last-update order, so idle ones sit at the front
+        while self.baselines:
+            key, baseline = next(iter(self.baselines.items()))
+            if now - baseline.last_seen < self.idle_timeout:
+                break
+            del self.baselines[key]
+            evicted += 1
+        return evicted
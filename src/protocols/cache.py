@@ -0,0 +1,104 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+import sys
+
+try:
+    import xxhash
+except ImportError:  # Optional; the built-in bytes hash is the fallback
+    xxhash = None
+
+class MetricCache:
+    """Bounded LRU cache of per-packet analysis results keyed by payload digest.
+
+    The digest is not collision resistant, so entries stored with their payload
+    only hit when the payload bytes match; a crafted packet cannot inherit the
+    results of a different one.
+    """
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self.sizes: Dict[Hashable, int] = {}
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.collisions = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def digest(packet_data: bytes) -> Hashable:
+        """Fast non-cryptographic 64-bit digest, paired with the length."""
+        if xxhash is not None:
+            return len(packet_data), xxhash.xxh3_64_intdigest(packet_data)
+        return len(packet_data), hash(packet_data)
+
+    def get(self, key: Hashable, payload: Optional[bytes] = None) -> Optional[Any]:
+        """Return the cached entry for key, counting the hit or miss.
+
+        When `payload` is given, an entry stored for different bytes is a miss.
+        """
+        stored = self.entries.get(key)
+        if stored is None:
+            self.misses += 1
+            return None
+        stored_payload, entry = stored
+        if payload is not None and stored_payload is not None and stored_payload != payload:
+            self.misses += 1
+            self.collisions += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: Hashable, entry: Any, payload: Optional[bytes] = None) -> None:
+        """Store an entry, evicting least recently used ones to fit the budget."""
+        entry = (bytes(payload) if payload is not None else None, entry)
+        size = self._estimate_size(key, entry)
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self.used_bytes -= self.sizes[key]
+
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        self.sizes[key] = size
+        self.used_bytes += size
+
+        while self.used_bytes > self.max_bytes:
+            old_key, _ = self.entries.popitem(last=False)
+            self.used_bytes -= self.sizes.pop(old_key)
+            self.evictions += 1
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'entries': len(self.entries),
+            'used_bytes': self.used_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'collisions': self.collisions,
+            'hit_rate': self.hit_rate
+        }
+
+    def _estimate_size(self, key: Hashable, entry: Any) -> int:
+        """Approximate the memory held by an entry, including its containers."""
+        size = sys.getsizeof(key)
+        stack = [entry]
+        while stack:
+            value = stack.pop()
+            size += sys.getsizeof(value)
+            if isinstance(value, dict):
+                stack.extend(value.values())
+            elif isinstance(value, (list, tuple)):
+                stack.extend(value)
+        return size
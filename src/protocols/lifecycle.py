@@ -0,0 +1,90 @@
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+import asyncio
+
+class StartupGraph:
+    """Dependency-aware startup and shutdown of protocol resources"""
+    def __init__(self):
+        self._start: Dict[str, Callable[[], Awaitable[None]]] = {}
+        self._stop: Dict[str, Optional[Callable[[], Awaitable[None]]]] = {}
+        self._depends_on: Dict[str, List[str]] = {}
+        self._started: List[str] = []
+
+    def add(self, name: str, start: Callable[[], Awaitable[None]],
+            depends_on: Iterable[str] = (), stop: Optional[Callable[[], Awaitable[None]]] = None) -> None:
+        """Register a startup step and the steps it must wait for.
+
+        `stop` only runs for steps whose `start` completed. When another step
+        fails, `start` may be cancelled midway and must release anything it
+        acquired before re-raising.
+        """
+        if name in self._start:
+            raise ValueError(f'Startup step {name} already registered')
+        self._start[name] = start
+        self._stop[name] = stop
+        self._depends_on[name] = list(depends_on)
+
+    async def start(self) -> None:
+        """Run every step as soon as its dependencies finish"""
+        self._validate()
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run(name: str) -> None:
+            await asyncio.gather(*(tasks[dep] for dep in self._depends_on[name]))
+            await self._start[name]()
+            self._started.append(name)
+
+        for name in self._start:
+            tasks[name] = asyncio.ensure_future(run(name))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            # Roll back whatever did come up before surfacing the failure
+            await self.stop()
+            raise
+
+    async def stop(self) -> None:
+        """Stop started steps, dependents before their dependencies"""
+        started = set(self._started)
+        dependents: Dict[str, List[str]] = {name: [] for name in started}
+        for name in started:
+            for dep in self._depends_on[name]:
+                if dep in started:
+                    dependents[dep].append(name)
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run(name: str) -> None:
+            await asyncio.gather(*(tasks[dependent] for dependent in dependents[name]),
+                                 return_exceptions=True)
+            stop = self._stop[name]
+            if stop is not None:
+                await stop()
+
+        for name in started:
+            tasks[name] = asyncio.ensure_future(run(name))
+        self._started = []
+        results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    def _validate(self) -> None:
+        visiting, done = set(), set()
+
+        def visit(name: str) -> None:
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f'Startup dependency cycle through {name}')
+            if name not in self._start:
+                raise ValueError(f'Unknown startup dependency {name}')
+            visiting.add(name)
+            for dep in self._depends_on[name]:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self._start:
+            visit(name)
@@ -0,0 +1,146 @@
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Optional
+import asyncio
+
+class ConnectionPool:
+    """Async pool of data source connections with health checks and graceful drain"""
+    def __init__(
+        self,
+        connect: Callable[[], Awaitable[Any]],
+        min_size: int = 1,
+        max_size: int = 10,
+        health_check: Optional[Callable[[Any], Awaitable[bool]]] = None,
+        close: Optional[Callable[[Any], Awaitable[None]]] = None,
+        acquire_timeout: Optional[float] = None
+    ):
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError('Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1')
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self._health_check = health_check
+        self._close = close
+        self.acquire_timeout = acquire_timeout
+        self._idle: Deque[Any] = deque()
+        self._size = 0
+        self._in_use = 0
+        self._closing = False
+        self._condition = asyncio.Condition()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    async def open(self) -> None:
+        """Establish the minimum number of connections concurrently"""
+        attempts = [asyncio.ensure_future(self._connect()) for _ in range(self.min_size)]
+        try:
+            connections = await asyncio.gather(*attempts)
+        except BaseException:
+            # Failed or cancelled: close whatever did connect instead of leaking it
+            for attempt in attempts:
+                attempt.cancel()
+            results = await asyncio.gather(*attempts, return_exceptions=True)
+            await asyncio.gather(*(self._discard(result) for result in results
+                                   if not isinstance(result, BaseException)))
+            raise
+        async with self._condition:
+            self._closing = False
+            self._idle.extend(connections)
+            self._size += len(connections)
+
+    async def acquire(self) -> Any:
+        """Check out a healthy connection, opening one if below max_size"""
+        return await asyncio.wait_for(self._acquire(), self.acquire_timeout)
+
+    async def release(self, connection: Any) -> None:
+        """Return a connection to the pool"""
+        async with self._condition:
+            self._in_use -= 1
+            if not self._closing:
+                self._idle.append(connection)
+            else:
+                self._size -= 1
+            self._condition.notify_all()
+        if self._closing:
+            await self._discard(connection)
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[Any]:
+        connection = await self.acquire()
+        try:
+            yield connection
+        finally:
+            await self.release(connection)
+
+    async def close(self, timeout: Optional[float] = None) -> None:
+        """Stop handing out connections, wait for borrowed ones, then close all"""
+        async with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+            try:
+                await asyncio.wait_for(self._condition.wait_for(lambda: self._in_use == 0), timeout)
+            except asyncio.TimeoutError:
+                pass
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+        await asyncio.gather(*(self._discard(connection) for connection in idle))
+
+    async def _acquire(self) -> Any:
+        while True:
+            async with self._condition:
+                await self._condition.wait_for(
+                    lambda: self._closing or self._idle or self._size < self.max_size
+                )
+                if self._closing:
+                    raise RuntimeError('Connection pool is closed')
+                connection = self._idle.popleft() if self._idle else None
+                # Reserve the slot before leaving the lock so concurrent acquires respect max_size
+                if connection is None:
+                    self._size += 1
+                self._in_use += 1
+
+            if connection is None:
+                try:
+                    return await self._connect()
+                except BaseException:
+                    await self._forget()
+                    raise
+
+            try:
+                healthy = await self._is_healthy(connection)
+            except BaseException:
+                # Cancelled (e.g. by acquire_timeout) mid-check; the connection's state is unknown
+                await self._discard(connection)
+                await self._forget()
+                raise
+            if healthy:
+                return connection
+            await self._discard(connection)
+            await self._forget()
+
+    async def _is_healthy(self, connection: Any) -> bool:
+        if self._health_check is None:
+            return True
+        try:
+            return await self._health_check(connection)
+        except Exception:
+            return False
+
+    async def _discard(self, connection: Any) -> None:
+        if self._close is not None:
+            try:
+                await self._close(connection)
+            except Exception:
+                pass
+
+    async def _forget(self) -> None:
+        async with self._condition:
+            self._size -= 1
+            self._in_use -= 1
+            self._condition.notify_all()
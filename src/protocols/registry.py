@@ -0,0 +1,169 @@
+from bisect import bisect
+from collections import deque
+from collections.abc import Mapping
+from functools import lru_cache
+from hashlib import blake2b
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional
+import asyncio
+
+class HashRing:
+    """Consistent hash ring mapping string keys onto shard numbers"""
+    def __init__(self, shards: Iterable[int], replicas: int = 64, cache_size: int = 1 << 16):
+        points = sorted(
+            (self._hash(f'{shard}:{replica}'), shard)
+            for shard in shards for replica in range(replicas)
+        )
+        self._keys = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+        # Hot agent IDs are routed on every message, so memoize their placement
+        self.shard_for = lru_cache(maxsize=cache_size)(self._shard_for)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        # Stable across processes, unlike the built-in hash()
+        return int.from_bytes(blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+    def _shard_for(self, key: str) -> int:
+        index = bisect(self._keys, self._hash(key)) % len(self._keys)
+        return self._shards[index]
+
+class Mailbox:
+    """Per-agent FIFO of message envelopes"""
+    __slots__ = ('messages', '_waiter')
+
+    def __init__(self):
+        self.messages: Deque[Dict[str, Any]] = deque()
+        self._waiter: Optional[asyncio.Future] = None
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def put(self, message: Dict[str, Any]) -> None:
+        self.messages.append(message)
+        self._wake()
+
+    def extend(self, messages: Iterable[Dict[str, Any]]) -> None:
+        self.messages.extend(messages)
+        self._wake()
+
+    async def get(self) -> Dict[str, Any]:
+        """Wait for and return the next message"""
+        while not self.messages:
+            if self._waiter is None:
+                self._waiter = asyncio.get_event_loop().create_future()
+            await asyncio.shield(self._waiter)
+        return self.messages.popleft()
+
+    def drain(self, max_messages: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Take up to max_messages queued messages without waiting"""
+        count = len(self.messages) if max_messages is None else min(max_messages, len(self.messages))
+        return [self.messages.popleft() for _ in range(count)]
+
+    def _wake(self) -> None:
+        if self._waiter is not None:
+            if not self._waiter.done():
+                self._waiter.set_result(None)
+            self._waiter = None
+
+class AgentShard:
+    """Agents and mailboxes owned by one shard"""
+    __slots__ = ('agents', 'mailboxes')
+
+    def __init__(self):
+        self.agents: Dict[str, Dict[str, Any]] = {}
+        self.mailboxes: Dict[str, Mailbox] = {}
+
+class ShardedAgentRegistry(Mapping):
+    """Agent registry partitioned across shards by consistent hashing.
+
+    A process only holds the shards listed in `local_shards`; messages for
+    agents on other shards are collected in `outbound` for a transport to carry.
+    """
+    def __init__(self, num_shards: int = 16, replicas: int = 64, local_shards: Optional[Iterable[int]] = None):
+        self.num_shards = num_shards
+        self.ring = HashRing(range(num_shards), replicas)
+        self.local_shards = set(range(num_shards) if local_shards is None else local_shards)
+        self.shards: Dict[int, AgentShard] = {shard: AgentShard() for shard in self.local_shards}
+        self.outbound: Dict[int, List[Dict[str, Any]]] = {}
+
+    def shard_for(self, agent_id: str) -> int:
+        return self.ring.shard_for(agent_id)
+
+    def is_local(self, agent_id: str) -> bool:
+        return self.shard_for(agent_id) in self.local_shards
+
+    def __getitem__(self, agent_id: str) -> Dict[str, Any]:
+        shard = self.shards.get(self.shard_for(agent_id))
+        if shard is None:
+            raise KeyError(agent_id)
+        return shard.agents[agent_id]
+
+    def __setitem__(self, agent_id: str, agent: Dict[str, Any]) -> None:
+        shard = self.shards.get(self.shard_for(agent_id))
+        if shard is None:
+            raise ValueError(f'Agent {agent_id} belongs to non-local shard {self.shard_for(agent_id)}')
+        shard.agents[agent_id] = agent
+        if agent_id not in shard.mailboxes:
+            shard.mailboxes[agent_id] = Mailbox()
+
+    def __delitem__(self, agent_id: str) -> None:
+        shard = self.shards.get(self.shard_for(agent_id))
+        if shard is None:
+            raise KeyError(agent_id)
+        del shard.agents[agent_id]
+        del shard.mailboxes[agent_id]
+
+    def __contains__(self, agent_id: object) -> bool:
+        if not isinstance(agent_id, str):
+            return False
+        shard = self.shards.get(self.shard_for(agent_id))
+        return shard is not None and agent_id in shard.agents
+
+    def __iter__(self) -> Iterator[str]:
+        for shard in self.shards.values():
+            yield from shard.agents
+
+    def __len__(self) -> int:
+        return sum(len(shard.agents) for shard in self.shards.values())
+
+    def mailbox(self, agent_id: str) -> Mailbox:
+        shard = self.shards.get(self.shard_for(agent_id))
+        if shard is None or agent_id not in shard.mailboxes:
+            raise ValueError(f'Agent {agent_id} not found')
+        return shard.mailboxes[agent_id]
+
+    def deliver(self, message: Dict[str, Any]) -> None:
+        """Route one envelope to its recipient's mailbox or shard outbox"""
+        shard_id = self.shard_for(message['to'])
+        shard = self.shards.get(shard_id)
+        if shard is None:
+            self.outbound.setdefault(shard_id, []).append(message)
+        else:
+            shard.mailboxes[message['to']].put(message)
+
+    def deliver_many(self, messages: Iterable[Dict[str, Any]]) -> None:
+        """Route a batch, waking each recipient at most once"""
+        by_recipient: Dict[str, List[Dict[str, Any]]] = {}
+        for message in messages:
+            by_recipient.setdefault(message['to'], []).append(message)
+
+        for agent_id, batch in by_recipient.items():
+            shard_id = self.shard_for(agent_id)
+            shard = self.shards.get(shard_id)
+            if shard is None:
+                self.outbound.setdefault(shard_id, []).extend(batch)
+            else:
+                shard.mailboxes[agent_id].extend(batch)
+
+    def return_outbound(self, messages: Iterable[Dict[str, Any]]) -> None:
+        """Put unsent remote messages back at the front of their shard outboxes"""
+        returned: Dict[int, List[Dict[str, Any]]] = {}
+        for message in messages:
+            returned.setdefault(self.shard_for(message['to']), []).append(message)
+        for shard_id, batch in returned.items():
+            self.outbound[shard_id] = batch + self.outbound.get(shard_id, [])
+
+    def take_outbound(self) -> Dict[int, List[Dict[str, Any]]]:
+        """Hand pending remote messages to the caller, grouped by shard"""
+        outbound, self.outbound = self.outbound, {}
+        return outbound
@@ -0,0 +1,394 @@
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+import _posixshmem
+import asyncio
+import json
+import logging
+import struct
+
+logger = logging.getLogger(__name__)
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+# Envelope frame: from_len, to_len, json_len, timestamp, blob_count
+_FRAME_HEADER = struct.Struct('<HHIdB')
+# Blob record: kind, size (followed by the bytes, or by a name length and shm name)
+_BLOB_HEADER = struct.Struct('<BI')
+_BLOB_INLINE = 0
+_BLOB_HANDLE = 1
+_RECORD_LENGTH = struct.Struct('<I')
+_COUNTER = struct.Struct('<Q')
+# Written last by the creator, so attachers never see a half-initialized ring
+_RING_READY = 0x4132415249474E31
+
+def _open_shm(name: Optional[str], create: bool = False, size: int = 0) -> SharedMemory:
+    # Segments change owner between processes, so their lifetime is managed
+    # explicitly instead of by the (shared) multiprocessing resource tracker
+    try:
+        return SharedMemory(name=name, create=create, size=size, track=False)
+    except TypeError:
+        # Python < 3.13 always registers with the resource tracker
+        shm = SharedMemory(name=name, create=create, size=size)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+def _unlink_shm(shm: SharedMemory) -> None:
+    # SharedMemory.unlink() would also unregister from the tracker before 3.13
+    _posixshmem.shm_unlink(shm._name)
+
+def _open_existing_shm(name: str) -> Optional[SharedMemory]:
+    """Open a segment another process may still be creating, or return None"""
+    try:
+        return _open_shm(name)
+    except (FileNotFoundError, ValueError):
+        # ValueError: mmap of a segment whose size has not been set yet
+        return None
+
+class SharedPayload:
+    """A message payload living in its own shared memory block.
+
+    Only the block name crosses the ring, so the bytes are never copied
+    between processes. The receiving side owns the block and must call
+    `release()` (after dropping any views of `buf`) to free it.
+    """
+    def __init__(self, shm: SharedMemory, size: int):
+        self._shm = shm
+        self.size = size
+
+    @classmethod
+    def allocate(cls, size: int) -> 'SharedPayload':
+        """Create a writable block to build a payload in place before sending"""
+        return cls(_open_shm(None, create=True, size=max(size, 1)), size)
+
+    @classmethod
+    def attach(cls, name: str, size: int) -> 'SharedPayload':
+        return cls(_open_shm(name), size)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def buf(self) -> memoryview:
+        return self._shm.buf[:self.size]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __bytes__(self) -> bytes:
+        return bytes(self._shm.buf[:self.size])
+
+    def close(self) -> None:
+        """Unmap the block in this process without freeing it"""
+        self._shm.close()
+
+    def release(self) -> None:
+        """Unmap and free the block"""
+        self._shm.close()
+        _unlink_shm(self._shm)
+
+def release_payloads(value: Any) -> None:
+    """Free every SharedPayload inside a decoded message content"""
+    if isinstance(value, SharedPayload):
+        value.release()
+    elif isinstance(value, dict):
+        for v in value.values():
+            release_payloads(v)
+    elif isinstance(value, list):
+        for v in value:
+            release_payloads(v)
+
+def encode_envelope(envelope: Dict[str, Any], inline_threshold: int = 64 * 1024) -> Tuple[bytes, List[SharedPayload]]:
+    """Encode an A2A envelope into a binary frame.
+
+    Bytes-like values in the content travel as raw blobs; those at or above
+    `inline_threshold` (and any SharedPayload) are sent by handle. Returns the
+    frame and the payload blocks created for it, which the sender should close
+    once the frame is written.
+    """
+    blobs: List[Union[BytesLike, SharedPayload]] = []
+
+    def extract(value: Any) -> Any:
+        if isinstance(value, (bytes, bytearray, memoryview, SharedPayload)):
+            blobs.append(value)
+            return {'__blob__': len(blobs) - 1}
+        if isinstance(value, dict):
+            return {k: extract(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [extract(v) for v in value]
+        return value
+
+    content = json.dumps(extract(envelope['content']), separators=(',', ':')).encode()
+    sender = envelope['from'].encode()
+    recipient = envelope['to'].encode()
+    if len(blobs) > 255:
+        raise ValueError('Too many binary values in one message')
+
+    parts = [_FRAME_HEADER.pack(len(sender), len(recipient), len(content), envelope['timestamp'], len(blobs)),
+             sender, recipient, content]
+    created = []
+    for blob in blobs:
+        if not isinstance(blob, SharedPayload) and len(blob) >= inline_threshold:
+            payload = SharedPayload.allocate(len(blob))
+            payload.buf[:] = blob
+            created.append(payload)
+            blob = payload
+        if isinstance(blob, SharedPayload):
+            name = blob.name.encode()
+            parts += [_BLOB_HEADER.pack(_BLOB_HANDLE, blob.size), bytes([len(name)]), name]
+        else:
+            parts += [_BLOB_HEADER.pack(_BLOB_INLINE, len(blob)), bytes(blob)]
+    return b''.join(parts), created
+
+def decode_envelope(frame: BytesLike) -> Dict[str, Any]:
+    """Decode a frame produced by `encode_envelope`"""
+    view = memoryview(frame)
+    from_len, to_len, content_len, timestamp, blob_count = _FRAME_HEADER.unpack_from(view)
+    offset = _FRAME_HEADER.size
+    sender = bytes(view[offset:offset + from_len]).decode()
+    offset += from_len
+    recipient = bytes(view[offset:offset + to_len]).decode()
+    offset += to_len
+    content = json.loads(bytes(view[offset:offset + content_len]))
+    offset += content_len
+
+    blobs: List[Union[bytes, SharedPayload]] = []
+    for _ in range(blob_count):
+        kind, size = _BLOB_HEADER.unpack_from(view, offset)
+        offset += _BLOB_HEADER.size
+        if kind == _BLOB_INLINE:
+            blobs.append(bytes(view[offset:offset + size]))
+            offset += size
+        else:
+            name_len = view[offset]
+            name = bytes(view[offset + 1:offset + 1 + name_len]).decode()
+            offset += 1 + name_len
+            blobs.append(SharedPayload.attach(name, size))
+
+    def restore(value: Any) -> Any:
+        if isinstance(value, dict):
+            if len(value) == 1 and '__blob__' in value:
+                return blobs[value['__blob__']]
+            return {k: restore(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [restore(v) for v in value]
+        return value
+
+    return {
+        'from': sender,
+        'to': recipient,
+        'content': restore(content),
+        'timestamp': timestamp
+    }
+
+class ShmRing:
+    """Single-producer, single-consumer byte ring in shared memory.
+
+    The producer only advances `tail` and the consumer only advances `head`,
+    each on its own cache line, so neither side takes a lock.
+    """
+    _HEAD = 0
+    _TAIL = 64
+    _CAPACITY = 128
+    _READY = 136
+    _DATA = 192
+
+    def __init__(self, shm: SharedMemory):
+        self.shm = shm
+        self.capacity = _COUNTER.unpack_from(shm.buf, self._CAPACITY)[0]
+        self._mask = self.capacity - 1
+
+    @classmethod
+    def create(cls, name: str, capacity: int) -> 'ShmRing':
+        if capacity <= 0 or capacity & (capacity - 1):
+            raise ValueError('Ring capacity must be a power of two')
+        shm = _open_shm(name, create=True, size=cls._DATA + capacity)
+        shm.buf[:cls._DATA] = bytes(cls._DATA)
+        _COUNTER.pack_into(shm.buf, cls._CAPACITY, capacity)
+        _COUNTER.pack_into(shm.buf, cls._READY, _RING_READY)
+        return cls(shm)
+
+    @classmethod
+    def try_attach(cls, name: str) -> Optional['ShmRing']:
+        """Attach to a ring, or return None if it does not exist or is not initialized yet"""
+        shm = _open_existing_shm(name)
+        if shm is None:
+            return None
+        if shm.size < cls._DATA or _COUNTER.unpack_from(shm.buf, cls._READY)[0] != _RING_READY:
+            shm.close()
+            return None
+        return cls(shm)
+
+    @classmethod
+    def discard_stale(cls, name: str) -> bool:
+        """Retire a ring left behind by a previous run; returns True if one existed"""
+        shm = _open_existing_shm(name)
+        if shm is None:
+            try:
+                _posixshmem.shm_unlink('/' + name)
+            except FileNotFoundError:
+                return False
+            return True
+        if shm.size >= cls._DATA:
+            # Writers that attached to it will no longer see it as ready
+            _COUNTER.pack_into(shm.buf, cls._READY, 0)
+        shm.close()
+        try:
+            _unlink_shm(shm)
+        except FileNotFoundError:
+            pass
+        return True
+
+    @property
+    def ready(self) -> bool:
+        """False once the consumer has unlinked or replaced the ring"""
+        return _COUNTER.unpack_from(self.shm.buf, self._READY)[0] == _RING_READY
+
+    def try_write(self, frame: BytesLike) -> bool:
+        """Append one frame; returns False if the ring is currently full"""
+        size = len(frame)
+        record = _RECORD_LENGTH.size + size
+        if record > self.capacity:
+            raise ValueError(f'Frame of {size} bytes does not fit in ring of {self.capacity}')
+
+        buf = self.shm.buf
+        head = _COUNTER.unpack_from(buf, self._HEAD)[0]
+        tail = _COUNTER.unpack_from(buf, self._TAIL)[0]
+        if self.capacity - (tail - head) < record:
+            return False
+
+        self._copy_in(tail, _RECORD_LENGTH.pack(size))
+        self._copy_in(tail + _RECORD_LENGTH.size, frame)
+        # Publish only after the frame bytes are in place
+        _COUNTER.pack_into(buf, self._TAIL, tail + record)
+        return True
+
+    def try_read(self) -> Optional[bytes]:
+        """Pop one frame, or return None if the ring is empty"""
+        buf = self.shm.buf
+        head = _COUNTER.unpack_from(buf, self._HEAD)[0]
+        tail = _COUNTER.unpack_from(buf, self._TAIL)[0]
+        if head == tail:
+            return None
+
+        size = _RECORD_LENGTH.unpack(self._copy_out(head, _RECORD_LENGTH.size))[0]
+        frame = self._copy_out(head + _RECORD_LENGTH.size, size)
+        _COUNTER.pack_into(buf, self._HEAD, head + _RECORD_LENGTH.size + size)
+        return frame
+
+    def close(self) -> None:
+        self.shm.close()
+
+    def unlink(self) -> None:
+        if self.shm.buf is not None:
+            # Lets attached producers notice the ring is gone
+            _COUNTER.pack_into(self.shm.buf, self._READY, 0)
+        _unlink_shm(self.shm)
+
+    def _copy_in(self, position: int, data: BytesLike) -> None:
+        data = memoryview(data).cast('B')
+        offset = position & self._mask
+        first = min(len(data), self.capacity - offset)
+        start = self._DATA + offset
+        self.shm.buf[start:start + first] = data[:first]
+        if first < len(data):
+            self.shm.buf[self._DATA:self._DATA + len(data) - first] = data[first:]
+
+    def _copy_out(self, position: int, size: int) -> bytes:
+        offset = position & self._mask
+        first = min(size, self.capacity - offset)
+        start = self._DATA + offset
+        if first == size:
+            return bytes(self.shm.buf[start:start + size])
+        return bytes(self.shm.buf[start:start + first]) + bytes(self.shm.buf[self._DATA:self._DATA + size - first])
+
+class ShmTransport:
+    """Local inter-process A2A transport over one shared-memory ring per process pair.
+
+    Process `i` creates the rings `<prefix>-<j>-<i>` it reads from and attaches
+    to the rings `<prefix>-<i>-<j>` it writes to, so every ring has exactly one
+    producer and one consumer.
+    """
+    def __init__(self, process_id: int, num_processes: int, prefix: str = 'a2a',
+                 capacity: int = 1 << 22, inline_threshold: int = 64 * 1024):
+        self.process_id = process_id
+        self.num_processes = num_processes
+        self.prefix = prefix
+        self.capacity = capacity
+        self.inline_threshold = inline_threshold
+        self.inbound: Dict[int, ShmRing] = {}
+        self.outbound: Dict[int, ShmRing] = {}
+
+    def _ring_name(self, src: int, dst: int) -> str:
+        return f'{self.prefix}-{src}-{dst}'
+
+    def open(self) -> None:
+        """Create the rings this process consumes, replacing any left by a crashed run"""
+        for src in range(self.num_processes):
+            if src != self.process_id:
+                name = self._ring_name(src, self.process_id)
+                if ShmRing.discard_stale(name):
+                    logger.warning('Replaced stale transport ring %s', name)
+                self.inbound[src] = ShmRing.create(name, self.capacity)
+
+    async def connect(self, timeout: float = 10.0) -> None:
+        """Attach to every peer's inbound ring, waiting for peers to open them"""
+        deadline = asyncio.get_event_loop().time() + timeout
+        for dst in range(self.num_processes):
+            while dst != self.process_id and dst not in self.outbound:
+                ring = ShmRing.try_attach(self._ring_name(self.process_id, dst))
+                if ring is not None:
+                    self.outbound[dst] = ring
+                elif asyncio.get_event_loop().time() > deadline:
+                    raise TimeoutError(f'Process {dst} did not open its transport')
+                else:
+                    await asyncio.sleep(0.01)
+
+    async def send_many(self, dst: int, envelopes: Iterable[Dict[str, Any]]) -> int:
+        """Write envelopes to the ring for process `dst`, waiting while it is full"""
+        ring = self.outbound[dst]
+        if not ring.ready:
+            # The peer restarted and replaced its ring; attach to the new one
+            ring.close()
+            del self.outbound[dst]
+            await self.connect()
+            ring = self.outbound[dst]
+        sent = 0
+        for envelope in envelopes:
+            frame, payloads = encode_envelope(envelope, self.inline_threshold)
+            delay = 0.0
+            try:
+                while not ring.try_write(frame):
+                    await asyncio.sleep(delay)
+                    delay = min(max(delay * 2, 1e-4), 1e-2)
+            except BaseException:
+                # The frame never went out, so nobody else will free its blocks
+                for payload in payloads:
+                    payload.release()
+                raise
+            # The receiver now owns the payload blocks; drop our mappings
+            for payload in payloads:
+                payload.close()
+            sent += 1
+        return sent
+
+    def poll(self, max_messages: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Read whatever envelopes are waiting in the inbound rings"""
+        messages = []
+        for ring in self.inbound.values():
+            while max_messages is None or len(messages) < max_messages:
+                frame = ring.try_read()
+                if frame is None:
+                    break
+                messages.append(decode_envelope(frame))
+        return messages
+
+    def close(self) -> None:
+        for ring in self.outbound.values():
+            ring.close()
+        for ring in self.inbound.values():
+            ring.unlink()
+            ring.close()
+        self.outbound = {}
+        self.inbound = {}
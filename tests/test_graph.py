@@ -0,0 +1,78 @@
+import unittest
+import torch
+from src.ai.graph import AgentGraph, SampledGraphInference
+from src.ai.models import BehaviorAnalyzer
+
+class TestSampledGraphInference(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.model = BehaviorAnalyzer(node_features=4, hidden_channels=8).eval()
+
+    def _random_graph(self, num_nodes: int = 50, num_edges: int = 150) -> AgentGraph:
+        graph = AgentGraph(num_features=4, initial_capacity=8)
+        for i in range(num_nodes):
+            graph.add_agent(f'agent-{i}', torch.randn(4))
+        for src, dst in torch.randint(0, num_nodes, (num_edges, 2)).tolist():
+            graph.add_edge(f'agent-{src}', f'agent-{dst}')
+        return graph
+
+    def test_edges_deduplicated(self):
+        graph = AgentGraph(num_features=4)
+        graph.add_agent('a', torch.zeros(4))
+        graph.add_agent('b', torch.zeros(4))
+        for _ in range(3):
+            graph.add_edge('a', 'b')
+        graph.edge_index  # Compacts pending edges
+        graph.add_edge('b', 'a')
+
+        self.assertEqual(graph.num_edges, 2)
+        self.assertEqual(graph.edge_index.tolist(), [[1, 0], [0, 1]])
+
+    def test_self_edges_match_full_graph(self):
+        # Explicit self-edges must not add a second loop on either path
+        graph = AgentGraph(num_features=4)
+        graph.add_agent('a', torch.randn(4))
+        graph.add_agent('b', torch.randn(4))
+        graph.add_edge('a', 'a')
+        graph.add_edge('a', 'b')
+        self.assertEqual(graph.num_edges, 2)
+
+        with torch.no_grad():
+            full = self.model.embed(graph.x, graph.edge_index)
+        inference = SampledGraphInference(self.model, graph, fanouts=(10, 10))
+        torch.testing.assert_close(inference.embed(), full, atol=1e-5, rtol=1e-5)
+
+    def test_unsampled_matches_full_graph(self):
+        # With fanouts above the max degree the result must not depend on batching
+        graph = self._random_graph()
+        with torch.no_grad():
+            full = self.model.embed(graph.x, graph.edge_index)
+
+        for batch_size in (1, 7, 10000):
+            inference = SampledGraphInference(self.model, graph, fanouts=(1000, 1000), batch_size=batch_size)
+            torch.testing.assert_close(inference.embed(), full, atol=1e-5, rtol=1e-5)
+
+    def test_refresh_recomputes_receptive_field_only(self):
+        graph = AgentGraph(num_features=4, undirected=False)
+        for i in range(6):
+            graph.add_agent(str(i), torch.randn(4))
+        for i in range(5):
+            graph.add_edge(str(i), str(i + 1))  # 0 -> 1 -> ... -> 5
+
+        inference = SampledGraphInference(self.model, graph, fanouts=(10, 10), batch_size=2)
+        self.assertEqual(inference.refresh(), 6)
+        self.assertEqual(inference.refresh(), 0)
+
+        # Node 2 reaches 3 and 4 within two layers, but not 5
+        graph.add_agent('2', torch.randn(4))
+        self.assertEqual(inference.refresh(), 3)
+
+        graph.add_edge('0', '5')
+        self.assertEqual(inference.refresh(), 1)
+
+        with torch.no_grad():
+            full = self.model.embed(graph.x, graph.edge_index)
+        torch.testing.assert_close(inference.embed(), full, atol=1e-5, rtol=1e-5)
+
+if __name__ == '__main__':
+    unittest.main()
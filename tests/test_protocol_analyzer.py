@@ -1,8 +1,10 @@
 import unittest
 import numpy as np
+import pandas as pd
 from datetime import datetime
 from src.protocols.analyzer import MCPAnalyzer
-from src.data.processor import DataProcessor
+from src.protocols.baseline import BaselineStore
+from src.data.processor import DataProcessor, IncrementalFeatureExtractor, _rolling_mean_std
 
 class TestMCPAnalyzer(unittest.TestCase):
     def setUp(self):
@@ -48,6 +50,76 @@ class TestMCPAnalyzer(unittest.TestCase):
         anomalies = self.analyzer.detect_anomalies([anomalous_packet])
         self.assertTrue(len(anomalies) > 0)
 
+    def test_per_protocol_baselines(self):
+        # MCP-3 traffic must not be judged against the MCP-1 baseline
+        for _ in range(10):
+            self.analyzer.analyze_packet(b'\x01\x00\x00\x00normal\x00')
+        for i in range(10):
+            self.analyzer.analyze_packet(b'\x03\x00\x00\x00' + bytes(range(i, i + 64)))
+
+        self.assertEqual(self.analyzer.baselines.get(('MCP-1',)).count, 10)
+        self.assertEqual(self.analyzer.baselines.get(('MCP-3',)).count, 10)
+
+        anomalies = self.analyzer.detect_anomalies([b'\x01\x00\x00\x00normal\x00'])
+        self.assertEqual(len(anomalies), 0)
+
+    def test_baseline_eviction(self):
+        store = BaselineStore(window=4, max_baselines=2, idle_timeout=10.0)
+        store.update('a', {'entropy': 1.0}, now=0.0)
+        store.update('b', {'entropy': 1.0}, now=5.0)
+        store.update('c', {'entropy': 1.0}, now=6.0)
+        self.assertNotIn('a', store)  # Least recently updated beyond max_baselines
+
+        store.update('c', {'entropy': 1.0}, now=15.0)
+        self.assertNotIn('b', store)  # Idle longer than idle_timeout
+        self.assertIn('c', store)
+
+        for value in [1.0, 2.0, 3.0, 4.0, 5.0]:
+            store.update('c', {'entropy': value}, now=16.0)
+        mean, std = store.get('c').stats()
+        self.assertAlmostEqual(mean[0], np.mean([2.0, 3.0, 4.0, 5.0]))
+        self.assertAlmostEqual(std[0], np.std([2.0, 3.0, 4.0, 5.0]))
+
+    def test_metric_cache(self):
+        analyzer = MCPAnalyzer(config={'anomaly_threshold': 0.95, 'metric_cache': True})
+        packet = b'\x02\x00\x00\x00poll\x00'
+
+        first = analyzer.analyze_packet(packet)
+        second = analyzer.analyze_packet(packet)
+        uncached = self.analyzer.analyze_packet(packet)
+
+        self.assertEqual(second['metrics'], uncached['metrics'])
+        self.assertEqual(second['structure'], uncached['structure'])
+        self.assertEqual(second['protocol_type'], 'MCP-2')
+        self.assertIsNot(first['metrics'], second['metrics'])
+        self.assertEqual(analyzer.metric_cache.hits, 1)
+        self.assertEqual(analyzer.metric_cache.misses, 1)
+        self.assertAlmostEqual(analyzer.metric_cache.hit_rate, 0.5)
+
+    def test_metric_cache_collision(self):
+        analyzer = MCPAnalyzer(config={'metric_cache': True})
+        # Force every packet onto one digest, as a crafted collision would
+        analyzer.metric_cache.digest = lambda packet_data: (len(packet_data), 0)
+        poll = b'\x02\x00\x00\x00poll\x00'
+        crafted = b'\x01\x00\x00\x00evil\xff'
+
+        analyzer.analyze_packet(poll)
+        analysis = analyzer.analyze_packet(crafted)
+        self.assertEqual(analysis['protocol_type'], self.analyzer.analyze_packet(crafted)['protocol_type'])
+        self.assertEqual(analysis['metrics'], self.analyzer.analyze_packet(crafted)['metrics'])
+        self.assertEqual(analyzer.metric_cache.collisions, 1)
+        self.assertEqual(analyzer.metric_cache.hits, 0)
+
+    def test_metric_cache_budget(self):
+        analyzer = MCPAnalyzer(config={'metric_cache': True, 'metric_cache_bytes': 4096})
+        for i in range(100):
+            analyzer.analyze_packet(b'\x01\x00\x00\x00' + bytes([i]) * 8)
+
+        cache = analyzer.metric_cache
+        self.assertLessEqual(cache.used_bytes, 4096)
+        self.assertGreater(cache.evictions, 0)
+        self.assertEqual(len(cache) + cache.evictions, 100)
+
     def test_metric_calculation(self):
         packet = b'\x01\x00\x00\x00test_data\x00'
         analysis = self.analyzer.analyze_packet(packet)
@@ -77,6 +149,46 @@ class TestMCPAnalyzer(unittest.TestCase):
         self.assertIsNotNone(processed_data)
         self.assertFalse(processed_data.empty)
 
+    def test_incremental_feature_extraction(self):
+        # Features for appended chunks must equal features for the whole frame
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({
+            'timestamp': pd.date_range('2024-01-01', periods=40, freq='37min'),
+            'protocol_type': rng.choice(['MCP-1', 'MCP-2'], 40),
+            'packet_size': rng.integers(50, 1500, 40)
+        })
+        df.loc[30:, 'protocol_type'] = 'MCP-3'  # Category first seen in a later chunk
+
+        batch = IncrementalFeatureExtractor().update(df)
+
+        extractor = IncrementalFeatureExtractor()
+        chunks = [extractor.update(df.iloc[start:end]) for start, end in [(0, 4), (4, 25), (25, 40)]]
+        incremental = pd.concat([c.reindex(columns=batch.columns, fill_value=False) for c in chunks])
+
+        pd.testing.assert_frame_equal(incremental, batch)
+        self.assertEqual(extractor.last_timestamp, df['timestamp'].iloc[-1])
+
+        # A chunk that goes back in time is rejected without touching the state
+        tail = extractor.packet_size_tail.copy()
+        with self.assertRaises(ValueError):
+            extractor.update(df.iloc[35:])
+        np.testing.assert_array_equal(extractor.packet_size_tail, tail)
+
+        # Rolling statistics agree with pandas
+        np.testing.assert_allclose(batch['avg_packet_size'], df['packet_size'].rolling(window=10).mean())
+        np.testing.assert_allclose(batch['packet_size_std'], df['packet_size'].rolling(window=10).std())
+
+    def test_rolling_stats_blocking_is_exact(self):
+        # Block size bounds memory only; every window is reduced exactly as before
+        values = np.random.default_rng(0).normal(size=5000) * 1000
+        mean, std = _rolling_mean_std(values, 25)
+        for block_elements in (1, 25, 333, 1 << 20):
+            blocked_mean, blocked_std = _rolling_mean_std(values, 25, block_elements)
+            np.testing.assert_array_equal(blocked_mean, mean)
+            np.testing.assert_array_equal(blocked_std, std)
+        self.assertTrue(np.isnan(mean[:24]).all())
+        np.testing.assert_allclose(mean[24:], pd.Series(values).rolling(25).mean()[24:])
+
     def test_checksum_verification(self):
         # Test valid checksum
         valid_packet = bytes([1, 2, 3, 4]) + bytes([10])
@@ -0,0 +1,288 @@
+import asyncio
+import unittest
+from src.protocols.base import AgentToAgentProtocol, ModelContextProtocol
+from src.protocols.lifecycle import StartupGraph
+from src.protocols.pool import ConnectionPool
+from src.protocols.registry import HashRing, Mailbox, ShardedAgentRegistry
+
+class FakeConnections:
+    def __init__(self):
+        self.opened = 0
+        self.closed = []
+        self.unhealthy = set()
+        self.check_delay = 0.0
+
+    async def connect(self):
+        self.opened += 1
+        return self.opened
+
+    async def health_check(self, connection):
+        await asyncio.sleep(self.check_delay)
+        return connection not in self.unhealthy
+
+    async def close(self, connection):
+        self.closed.append(connection)
+
+    def pool(self, **kwargs) -> ConnectionPool:
+        return ConnectionPool(self.connect, health_check=self.health_check, close=self.close, **kwargs)
+
+class TestConnectionPool(unittest.IsolatedAsyncioTestCase):
+    async def test_respects_max_size(self):
+        fake = FakeConnections()
+        pool = fake.pool(min_size=0, max_size=2)
+        first = await pool.acquire()
+        second = await pool.acquire()
+        waiter = asyncio.ensure_future(pool.acquire())
+        await asyncio.sleep(0.01)
+        self.assertFalse(waiter.done())
+        self.assertEqual(pool.size, 2)
+
+        await pool.release(first)
+        self.assertEqual(await waiter, first)
+        await pool.release(first)
+        await pool.release(second)
+        self.assertEqual((pool.size, pool.in_use, fake.opened), (2, 0, 2))
+
+    async def test_acquire_timeout(self):
+        fake = FakeConnections()
+        pool = fake.pool(min_size=1, max_size=1, acquire_timeout=0.05)
+        await pool.open()
+        connection = await pool.acquire()
+        with self.assertRaises(asyncio.TimeoutError):
+            await pool.acquire()
+        await pool.release(connection)
+        self.assertEqual(pool.in_use, 0)
+
+    async def test_timeout_during_health_check_discards_connection(self):
+        fake = FakeConnections()
+        pool = fake.pool(min_size=1, max_size=1, acquire_timeout=0.05)
+        await pool.open()
+        fake.check_delay = 1.0
+        with self.assertRaises(asyncio.TimeoutError):
+            await pool.acquire()
+        self.assertEqual((pool.size, pool.in_use, fake.closed), (0, 0, [1]))
+
+        # The slot was freed, so a fresh connection can be opened
+        fake.check_delay = 0.0
+        async with pool.connection() as connection:
+            self.assertEqual(connection, 2)
+
+    async def test_unhealthy_connection_is_replaced(self):
+        fake = FakeConnections()
+        pool = fake.pool(min_size=1, max_size=1)
+        await pool.open()
+        fake.unhealthy.add(1)
+        async with pool.connection() as connection:
+            self.assertEqual(connection, 2)
+        self.assertEqual(fake.closed, [1])
+        self.assertEqual(pool.size, 1)
+
+    async def test_close_drains_borrowed_connections(self):
+        fake = FakeConnections()
+        pool = fake.pool(min_size=2, max_size=2)
+        await pool.open()
+        borrowed = await pool.acquire()
+        closing = asyncio.ensure_future(pool.close())
+        await asyncio.sleep(0.01)
+        self.assertFalse(closing.done())
+        with self.assertRaises(RuntimeError):
+            await pool.acquire()
+
+        await pool.release(borrowed)
+        await closing
+        self.assertEqual(sorted(fake.closed), [1, 2])
+        self.assertEqual(pool.size, 0)
+
+    async def test_reopen_after_close(self):
+        fake = FakeConnections()
+        pool = fake.pool(min_size=1, max_size=1)
+        await pool.open()
+        await pool.close()
+        await pool.open()
+        async with pool.connection() as connection:
+            self.assertEqual(connection, 2)
+
+    async def test_failed_open_closes_established_connections(self):
+        fake = FakeConnections()
+
+        async def connect():
+            connection = await fake.connect()
+            if connection == 3:
+                raise ConnectionError('refused')
+            return connection
+
+        pool = ConnectionPool(connect, min_size=4, max_size=4, close=fake.close)
+        with self.assertRaises(ConnectionError):
+            await pool.open()
+        self.assertEqual(sorted(fake.closed), [1, 2, 4])
+        self.assertEqual(pool.size, 0)
+
+class TestStartupGraph(unittest.IsolatedAsyncioTestCase):
+    async def test_dependencies_start_first_and_stop_last(self):
+        events = []
+        graph = StartupGraph()
+        for name, deps in (('db', ()), ('cache', ('db',)), ('api', ('db', 'cache'))):
+            graph.add(name, self._step(events, 'start', name), deps, self._step(events, 'stop', name))
+
+        await graph.start()
+        self.assertEqual(events, [('start', 'db'), ('start', 'cache'), ('start', 'api')])
+        events.clear()
+        await graph.stop()
+        self.assertEqual(events, [('stop', 'api'), ('stop', 'cache'), ('stop', 'db')])
+
+    async def test_failed_start_rolls_back(self):
+        events = []
+
+        async def fail():
+            raise ConnectionError('model server down')
+
+        graph = StartupGraph()
+        graph.add('db', self._step(events, 'start', 'db'), stop=self._step(events, 'stop', 'db'))
+        graph.add('model', fail, ('db',), stop=self._step(events, 'stop', 'model'))
+        graph.add('api', self._step(events, 'start', 'api'), ('model',), stop=self._step(events, 'stop', 'api'))
+
+        with self.assertRaises(ConnectionError):
+            await graph.start()
+        # Only the step that actually started is stopped
+        self.assertEqual(events, [('start', 'db'), ('stop', 'db')])
+
+    async def test_failed_start_releases_interrupted_pool(self):
+        started, connected, closed = [], [], []
+
+        async def connect():
+            index = len(started)
+            started.append(index)
+            await asyncio.sleep(0.01 * (index + 1))  # Staggered connects
+            connected.append(index)
+            return index
+
+        async def close(connection):
+            closed.append(connection)
+
+        async def load_model():
+            await asyncio.sleep(0.025)
+            raise ConnectionError('model server down')
+
+        mcp = ModelContextProtocol({'data_sources': {'db': {'min_size': 4}}})
+        mcp.register_data_source('db', connect, close=close)
+        mcp.register_model('scorer', load_model)
+        with self.assertRaises(ConnectionError):
+            await mcp.initialize()
+        # The pool was still opening when the model failed; nothing it opened leaks
+        self.assertEqual(len(started), 4)
+        self.assertLess(len(connected), 4)
+        self.assertEqual(sorted(closed), connected)
+        self.assertEqual(mcp.data_sources['db'].size, 0)
+
+    async def test_rejects_cycles(self):
+        graph = StartupGraph()
+        graph.add('a', self._step([], 'start', 'a'), ('b',))
+        graph.add('b', self._step([], 'start', 'b'), ('a',))
+        with self.assertRaises(ValueError):
+            await graph.start()
+
+    @staticmethod
+    def _step(events, kind, name):
+        async def step():
+            await asyncio.sleep(0)
+            events.append((kind, name))
+        return step
+
+class TestHashRing(unittest.TestCase):
+    def test_placement_is_stable_and_spread(self):
+        ring = HashRing(range(8))
+        keys = [f'agent-{i}' for i in range(2000)]
+        placement = [ring.shard_for(key) for key in keys]
+        self.assertEqual(placement, [HashRing(range(8)).shard_for(key) for key in keys])
+        counts = [placement.count(shard) for shard in range(8)]
+        self.assertTrue(all(count > 100 for count in counts), counts)
+
+    def test_adding_a_shard_moves_few_keys(self):
+        keys = [f'agent-{i}' for i in range(2000)]
+        before, after = HashRing(range(8)), HashRing(range(9))
+        moved = [key for key in keys if before.shard_for(key) != after.shard_for(key)]
+        self.assertTrue(all(after.shard_for(key) == 8 for key in moved))
+        self.assertLess(len(moved), len(keys) // 4)
+
+class TestMailbox(unittest.IsolatedAsyncioTestCase):
+    async def test_get_waits_for_put(self):
+        mailbox = Mailbox()
+        getter = asyncio.ensure_future(mailbox.get())
+        await asyncio.sleep(0)
+        self.assertFalse(getter.done())
+        mailbox.put({'n': 1})
+        self.assertEqual(await getter, {'n': 1})
+
+    async def test_drain(self):
+        mailbox = Mailbox()
+        mailbox.extend({'n': n} for n in range(5))
+        self.assertEqual(mailbox.drain(2), [{'n': 0}, {'n': 1}])
+        self.assertEqual(mailbox.drain(), [{'n': 2}, {'n': 3}, {'n': 4}])
+        self.assertEqual(mailbox.drain(), [])
+
+class TestShardedAgentRegistry(unittest.TestCase):
+    def test_mapping_behavior(self):
+        registry = ShardedAgentRegistry(num_shards=4)
+        for i in range(20):
+            registry[f'agent-{i}'] = {'id': f'agent-{i}'}
+        self.assertEqual(len(registry), 20)
+        self.assertIn('agent-3', registry)
+        self.assertNotIn('agent-99', registry)
+        self.assertNotIn(3, registry)
+        self.assertEqual(registry['agent-3'], {'id': 'agent-3'})
+        self.assertEqual(sorted(registry), sorted(f'agent-{i}' for i in range(20)))
+
+        del registry['agent-3']
+        self.assertNotIn('agent-3', registry)
+        with self.assertRaises(KeyError):
+            registry['agent-3']
+
+    def test_deliver_many_routes_local_and_remote(self):
+        registry = ShardedAgentRegistry(num_shards=4, local_shards=[0, 1])
+        local = [f'agent-{i}' for i in range(40) if registry.is_local(f'agent-{i}')][:3]
+        remote = [f'agent-{i}' for i in range(40) if not registry.is_local(f'agent-{i}')][:3]
+        for agent_id in local:
+            registry[agent_id] = {'id': agent_id}
+        with self.assertRaises(ValueError):
+            registry[remote[0]] = {'id': remote[0]}
+
+        registry.deliver_many({'to': agent_id, 'n': n} for n in range(2) for agent_id in local + remote)
+        for agent_id in local:
+            self.assertEqual(registry.mailbox(agent_id).drain(), [{'to': agent_id, 'n': 0}, {'to': agent_id, 'n': 1}])
+
+        outbound = registry.take_outbound()
+        self.assertEqual(sum(len(messages) for messages in outbound.values()), 6)
+        for shard, messages in outbound.items():
+            self.assertNotIn(shard, registry.local_shards)
+            self.assertTrue(all(registry.shard_for(message['to']) == shard for message in messages))
+        self.assertEqual(registry.take_outbound(), {})
+
+class TestAgentToAgentProtocol(unittest.IsolatedAsyncioTestCase):
+    async def test_send_and_receive(self):
+        protocol = AgentToAgentProtocol({'num_shards': 4})
+        await protocol.register_agent('a', [])
+        await protocol.register_agent('b', [])
+        await protocol.send_message('a', 'b', {'n': 0})
+        self.assertEqual(await protocol.send_many(('a', 'b', {'n': n}) for n in (1, 2)), 2)
+        self.assertEqual((await protocol.receive('b'))['content'], {'n': 0})
+        self.assertEqual([m['content'] for m in await protocol.receive_many('b')], [{'n': 1}, {'n': 2}])
+
+        with self.assertRaises(ValueError):
+            await protocol.send_message('a', 'missing', {})
+
+    async def test_remote_send_requires_transport(self):
+        protocol = AgentToAgentProtocol({'num_shards': 4, 'local_shards': [0]})
+        sender = next(f'agent-{i}' for i in range(100) if protocol.agents.shard_for(f'agent-{i}') == 0)
+        remote = next(f'agent-{i}' for i in range(100) if protocol.agents.shard_for(f'agent-{i}') != 0)
+        await protocol.register_agent(sender, [])
+
+        with self.assertRaises(RuntimeError):
+            await protocol.send_message(sender, remote, {})
+        with self.assertRaises(RuntimeError):
+            await protocol.send_many([(sender, sender, {}), (sender, remote, {})])
+        # Nothing was queued for a transport that does not exist
+        self.assertEqual(protocol.agents.outbound, {})
+        self.assertEqual(len(protocol.agents.mailbox(sender)), 0)
+
+if __name__ == '__main__':
+    unittest.main()
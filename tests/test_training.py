@@ -0,0 +1,178 @@
+import os
+import random
+import socket
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+from src.ai.checkpoint import AsyncCheckpointer, capture_rng_state, restore_rng_state
+from src.ai.train import MemmapDataset, ModelTrainer, TrainingConfig, train_distributed
+from src.data.processor import DataProcessor
+
+class TinyClassifier(nn.Module):
+    def __init__(self):
+        super(TinyClassifier, self).__init__()
+        self.fc = nn.Linear(3, 2)
+
+    def forward(self, inputs):
+        return self.fc(inputs['features'])
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def write_training_data(directory: str, rows: int = 103):
+    features = pd.DataFrame({
+        'row': np.arange(rows, dtype=float),
+        'a': np.random.default_rng(0).normal(size=rows),
+        'b': np.random.default_rng(1).normal(size=rows)
+    })
+    labels = [i % 2 for i in range(rows)]
+    return DataProcessor().prepare_training_data(features, labels, output_dir=directory)
+
+class TestTrainingConfig(unittest.TestCase):
+    def test_defaults_share_cores_between_ranks(self):
+        with mock.patch('src.ai.train.os.cpu_count', return_value=64):
+            single = TrainingConfig(world_size=1)
+            crowded = TrainingConfig(world_size=64)
+            explicit = TrainingConfig(world_size=64, num_workers=2)
+        self.assertEqual((single.num_workers, single.threads_per_worker), (8, 56))
+        # One core per rank: load batches inline instead of spawning loader processes
+        self.assertEqual((crowded.num_workers, crowded.threads_per_worker), (0, 1))
+        self.assertEqual(explicit.num_workers, 2)
+
+class TestTrainingInput(unittest.TestCase):
+    def test_memmap_dataloader_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            X, y = write_training_data(directory)
+            self.assertIsInstance(X, np.memmap)
+            self.assertEqual(X.dtype, np.float32)
+
+            config = TrainingConfig(batch_size=10, device='cpu', num_workers=2, pin_memory=False)
+            trainer = ModelTrainer(TinyClassifier(), config)
+            dataloader = trainer.create_dataloader(MemmapDataset(directory))
+
+            rows = []
+            for batch in dataloader:
+                self.assertLessEqual(len(batch['labels']), 10)
+                row_ids = batch['features'][:, 0].long()
+                self.assertTrue(torch.equal(batch['labels'], row_ids % 2))
+                rows.extend(row_ids.tolist())
+
+            # Every row is seen exactly once per epoch
+            self.assertEqual(sorted(rows), list(range(103)))
+
+class CrashingLoader:
+    """Wraps a loader and raises after a fixed number of batches, like a killed worker"""
+    def __init__(self, dataloader, crash_after: int):
+        self.dataloader = dataloader
+        self.sampler = dataloader.sampler
+        self.crash_after = crash_after
+
+    def __len__(self):
+        return len(self.dataloader)
+
+    def __iter__(self):
+        for batch in self.dataloader:
+            if self.crash_after == 0:
+                raise RuntimeError('simulated crash')
+            self.crash_after -= 1
+            yield batch
+
+class TestCheckpointResume(unittest.TestCase):
+    def _train(self, config, directory, crash_after=None, seed=0):
+        torch.manual_seed(seed)
+        trainer = ModelTrainer(TinyClassifier(), config)
+        trainer.resume_from_checkpoint()
+        dataloader = trainer.create_dataloader(MemmapDataset(directory))
+        if crash_after is not None:
+            dataloader = CrashingLoader(dataloader, crash_after)
+        try:
+            while trainer.epoch < config.epochs:
+                trainer.train_epoch(dataloader)
+        finally:
+            if trainer.checkpointer:
+                trainer.checkpointer.close()
+        return trainer
+
+    def test_resume_is_bit_identical(self):
+        # 103 rows in batches of 8 give 13 steps per epoch; an interval of 13
+        # checkpoints exactly at the end of the first epoch
+        for interval in (5, 13):
+            with self.subTest(interval=interval), tempfile.TemporaryDirectory() as directory:
+                write_training_data(directory)
+                options = dict(batch_size=8, device='cpu', num_workers=0, pin_memory=False, epochs=3,
+                               learning_rate=1e-2)
+                reference = self._train(TrainingConfig(**options), directory)
+
+                config = TrainingConfig(checkpoint_dir=os.path.join(directory, 'checkpoints'),
+                                        checkpoint_interval=interval, keep_checkpoints=1, **options)
+                with self.assertRaisesRegex(RuntimeError, 'simulated crash'):
+                    self._train(config, directory, crash_after=20)
+                # A different initialization proves everything comes from the checkpoint
+                resumed = self._train(config, directory, seed=1)
+
+                self.assertEqual(resumed.global_step, reference.global_step)
+                for name, value in reference.module.state_dict().items():
+                    self.assertTrue(torch.equal(resumed.module.state_dict()[name], value), name)
+
+    def test_checkpoint_at_epoch_end_starts_next_epoch(self):
+        with tempfile.TemporaryDirectory() as directory:
+            write_training_data(directory)
+            config = TrainingConfig(batch_size=8, device='cpu', num_workers=0, pin_memory=False, epochs=1,
+                                    checkpoint_dir=os.path.join(directory, 'checkpoints'), checkpoint_interval=13)
+            self._train(config, directory)
+
+            trainer = ModelTrainer(TinyClassifier(), config)
+            self.assertTrue(trainer.resume_from_checkpoint())
+            self.assertEqual((trainer.epoch, trainer.step_in_epoch, trainer.global_step), (1, 0, 13))
+            trainer.checkpointer.close()
+
+    def test_rng_state_loads_with_weights_only(self):
+        with tempfile.TemporaryDirectory() as directory:
+            checkpointer = AsyncCheckpointer(directory)
+            checkpointer.save(1, {'trainer.rank0': {'rng_state': capture_rng_state()}})
+            checkpointer.close()
+            expected = (random.random(), np.random.rand(), torch.rand(1))
+
+            path = os.path.join(checkpointer.latest(), 'trainer.rank0.pt')
+            restore_rng_state(torch.load(path, weights_only=True)['rng_state'])
+            self.assertEqual((random.random(), np.random.rand()), expected[:2])
+            self.assertTrue(torch.equal(torch.rand(1), expected[2]))
+
+    def test_prune_waits_for_slower_ranks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            checkpointer = AsyncCheckpointer(directory, rank=0, world_size=2, keep=1)
+            for step in (1, 2, 3):
+                checkpointer.save(step, {'model': {'step': torch.tensor(step)}})
+            checkpointer.wait()
+            # Rank 1 has not finished any step, so nothing may be removed
+            self.assertEqual(sorted(checkpointer._steps()), [1, 2, 3])
+
+            open(os.path.join(checkpointer._step_dir(2), 'done.rank1'), 'w').close()
+            checkpointer.save(4, {'model': {'step': torch.tensor(4)}})
+            checkpointer.close()
+            self.assertEqual(sorted(checkpointer._steps()), [2, 3, 4])
+            self.assertEqual(checkpointer.latest(), checkpointer._step_dir(2))
+
+class TestDistributedTraining(unittest.TestCase):
+    def test_two_rank_gloo_smoke(self):
+        with tempfile.TemporaryDirectory() as directory:
+            write_training_data(directory)
+            checkpoint_path = os.path.join(directory, 'model.pt')
+            config = TrainingConfig(batch_size=8, device='cpu', num_workers=0, pin_memory=False, epochs=2,
+                                    world_size=2, gradient_accumulation_steps=3, master_port=free_port())
+
+            train_distributed(TinyClassifier, directory, config, checkpoint_path=checkpoint_path)
+
+            checkpoint = torch.load(checkpoint_path)
+            self.assertEqual(checkpoint['epoch'], 2)
+            for value in checkpoint['model_state_dict'].values():
+                self.assertTrue(torch.isfinite(value).all())
+
+if __name__ == '__main__':
+    unittest.main()
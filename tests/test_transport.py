@@ -0,0 +1,233 @@
+import asyncio
+import multiprocessing
+import os
+import time
+import unittest
+from src.protocols.base import AgentToAgentProtocol
+from src.protocols.transport import (
+    SharedPayload, ShmRing, ShmTransport, _open_shm, _unlink_shm, decode_envelope, encode_envelope,
+    release_payloads
+)
+
+def unique_name(tag: str) -> str:
+    return f'a2a-test-{os.getpid()}-{tag}'
+
+def send_from_child(prefix: str, count: int) -> None:
+    async def run():
+        transport = ShmTransport(1, 2, prefix=prefix, capacity=1 << 12)
+        transport.open()
+        await transport.connect()
+        envelopes = [
+            {'from': 'b', 'to': 'a', 'content': {'n': n, 'blob': bytes([n % 256]) * (n * 37)}, 'timestamp': float(n)}
+            for n in range(count)
+        ]
+        envelopes.append({'from': 'b', 'to': 'a', 'content': {'large': b'x' * 100000}, 'timestamp': -1.0})
+        await transport.send_many(0, envelopes)
+        transport.close()
+    asyncio.run(run())
+
+class TestFrames(unittest.TestCase):
+    def test_round_trip(self):
+        envelope = {
+            'from': 'agent-1',
+            'to': 'agent-2',
+            'content': {'text': 'hi', 'nested': [1, {'raw': b'\x00\x01'}, (2, 3)], 'view': memoryview(b'abc')},
+            'timestamp': 12.5
+        }
+        frame, created = encode_envelope(envelope)
+        self.assertEqual(created, [])
+        decoded = decode_envelope(frame)
+        self.assertEqual(decoded['from'], 'agent-1')
+        self.assertEqual(decoded['to'], 'agent-2')
+        self.assertEqual(decoded['timestamp'], 12.5)
+        self.assertEqual(decoded['content'], {'text': 'hi', 'nested': [1, {'raw': b'\x00\x01'}, [2, 3]], 'view': b'abc'})
+
+    def test_large_values_travel_by_handle(self):
+        data = os.urandom(1000)
+        frame, created = encode_envelope({'from': 'a', 'to': 'b', 'content': {'data': data}, 'timestamp': 0.0},
+                                         inline_threshold=100)
+        self.assertEqual(len(created), 1)
+        self.assertLess(len(frame), len(data))
+        for payload in created:
+            payload.close()
+
+        payload = decode_envelope(frame)['content']['data']
+        self.assertIsInstance(payload, SharedPayload)
+        self.assertEqual(bytes(payload), data)
+        release_payloads({'data': [payload]})
+        with self.assertRaises(FileNotFoundError):
+            SharedPayload.attach(payload.name, len(data))
+
+class TestShmRing(unittest.TestCase):
+    def setUp(self):
+        self.ring = ShmRing.create(unique_name(self._testMethodName), 256)
+
+    def tearDown(self):
+        self.ring.unlink()
+        self.ring.close()
+
+    def test_wrap_around(self):
+        # Frames of varying size cross the end of the buffer many times
+        frames = [bytes([n % 256]) * (1 + n * 7 % 90) for n in range(200)]
+        received = []
+        for frame in frames:
+            while not self.ring.try_write(frame):
+                received.append(self.ring.try_read())
+        while True:
+            frame = self.ring.try_read()
+            if frame is None:
+                break
+            received.append(frame)
+        self.assertEqual(received, frames)
+
+    def test_full_and_oversized(self):
+        self.assertTrue(self.ring.try_write(b'x' * 200))
+        self.assertFalse(self.ring.try_write(b'y' * 100))
+        with self.assertRaises(ValueError):
+            self.ring.try_write(b'z' * 256)
+        self.assertEqual(self.ring.try_read(), b'x' * 200)
+        self.assertIsNone(self.ring.try_read())
+
+    def test_attach_waits_for_ready_ring(self):
+        name = unique_name('pending')
+        self.assertIsNone(ShmRing.try_attach(name))
+        # A segment that exists but was not initialized by ShmRing.create
+        shm = _open_shm(name, create=True, size=1024)
+        try:
+            self.assertIsNone(ShmRing.try_attach(name))
+        finally:
+            shm.close()
+            _unlink_shm(shm)
+
+        ring = ShmRing.try_attach(self.ring.shm.name)
+        self.assertEqual(ring.capacity, 256)
+        ring.close()
+
+class TestShmTransport(unittest.TestCase):
+    def test_open_replaces_stale_rings(self):
+        prefix = unique_name('stale')
+        stale = ShmRing.create(f'{prefix}-1-0', 256)
+        stale.close()
+
+        transport = ShmTransport(0, 2, prefix=prefix, capacity=256)
+        transport.open()
+        self.assertEqual(transport.inbound[1].capacity, 256)
+        transport.close()
+        self.assertIsNone(ShmRing.try_attach(f'{prefix}-1-0'))
+
+    def test_two_process_send_and_poll(self):
+        prefix = unique_name('pair')
+        transport = ShmTransport(0, 2, prefix=prefix, capacity=1 << 12)
+        transport.open()
+        count = 100
+        child = multiprocessing.get_context('spawn').Process(target=send_from_child, args=(prefix, count))
+        child.start()
+
+        messages = []
+        deadline = time.monotonic() + 30
+        try:
+            while len(messages) < count + 1 and time.monotonic() < deadline:
+                messages.extend(transport.poll())
+                time.sleep(0.001)
+            child.join(30)
+            self.assertEqual(child.exitcode, 0)
+        finally:
+            transport.close()
+
+        self.assertEqual(len(messages), count + 1)
+        for n, message in enumerate(messages[:count]):
+            self.assertEqual((message['from'], message['to'], message['timestamp']), ('b', 'a', float(n)))
+            self.assertEqual(message['content'], {'n': n, 'blob': bytes([n % 256]) * (n * 37)})
+        large = messages[-1]['content']['large']
+        self.assertIsInstance(large, SharedPayload)
+        self.assertEqual(bytes(large), b'x' * 100000)
+        release_payloads(messages[-1]['content'])
+        if os.path.isdir('/dev/shm'):
+            self.assertEqual([name for name in os.listdir('/dev/shm') if name.startswith(prefix)], [])
+
+class FailingTransport:
+    """Accepts one envelope, then fails the way a dead peer would"""
+    process_id = 0
+    num_processes = 2
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_many(self, dst, envelopes):
+        for envelope in envelopes:
+            if self.sent:
+                raise ConnectionResetError('peer gone')
+            self.sent.append(envelope)
+        return len(self.sent)
+
+class TestTransportProtocol(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.prefix = unique_name(f'proto-{self._testMethodName}')
+        self.transports = [ShmTransport(i, 2, prefix=self.prefix, capacity=1 << 14) for i in range(2)]
+        for transport in self.transports:
+            transport.open()
+        for transport in self.transports:
+            await transport.connect()
+        # With the default owner, process i holds the shards congruent to i mod 2
+        self.protocols = [AgentToAgentProtocol({'num_shards': 4, 'local_shards': [i, i + 2]}) for i in range(2)]
+        for protocol, transport in zip(self.protocols, self.transports):
+            protocol.attach_transport(transport)
+
+    async def asyncTearDown(self):
+        for transport in self.transports:
+            transport.close()
+
+    def agent_on(self, process_id: int, skip: int = 0) -> str:
+        protocol = self.protocols[process_id]
+        agents = (f'agent-{i}' for i in range(1000) if protocol.agents.is_local(f'agent-{i}'))
+        for _ in range(skip):
+            next(agents)
+        return next(agents)
+
+    async def test_send_across_processes(self):
+        sender, recipient = self.agent_on(0), self.agent_on(1)
+        await self.protocols[0].register_agent(sender, [])
+        await self.protocols[1].register_agent(recipient, [])
+
+        await self.protocols[0].send_message(sender, recipient, {'n': 0, 'raw': b'x' * 100000})
+        await self.protocols[0].send_many((sender, recipient, {'n': n}) for n in (1, 2))
+        self.assertEqual(self.protocols[0].agents.outbound, {})
+
+        self.assertEqual(await self.protocols[1].pump_transport(), 3)
+        first = await self.protocols[1].receive(recipient)
+        self.assertEqual(first['from'], sender)
+        self.assertEqual(bytes(first['content']['raw']), b'x' * 100000)
+        release_payloads(first['content'])
+        self.assertEqual([m['content'] for m in await self.protocols[1].receive_many(recipient)], [{'n': 1}, {'n': 2}])
+
+    async def test_unknown_remote_recipient_is_logged(self):
+        sender = self.agent_on(0)
+        await self.protocols[0].register_agent(sender, [])
+        ghost = self.agent_on(1)
+        await self.protocols[0].send_message(sender, ghost, {})
+        with self.assertLogs('src.protocols.base', 'WARNING'):
+            self.assertEqual(await self.protocols[1].pump_transport(), 0)
+
+    def test_shard_owner_must_match_local_shards(self):
+        protocol = AgentToAgentProtocol({'num_shards': 4, 'local_shards': [0, 1]})
+        with self.assertRaises(ValueError):
+            protocol.attach_transport(self.transports[0])
+        protocol.attach_transport(self.transports[0], shard_owner=lambda shard: shard // 2)
+        with self.assertRaises(ValueError):
+            protocol.attach_transport(self.transports[0], shard_owner=lambda shard: 2)
+
+    async def test_failed_flush_keeps_unsent_messages(self):
+        protocol = AgentToAgentProtocol({'num_shards': 4, 'local_shards': [0, 2]})
+        protocol.attach_transport(self.transports[0])
+        sender, recipient = self.agent_on(0), self.agent_on(1)
+        await protocol.register_agent(sender, [])
+        protocol.transport = transport = FailingTransport()
+
+        with self.assertRaises(ConnectionResetError):
+            await protocol.send_many((sender, recipient, {'n': n}) for n in range(3))
+        self.assertEqual([m['content'] for m in transport.sent], [{'n': 0}])
+        remaining = [m['content'] for messages in protocol.agents.outbound.values() for m in messages]
+        self.assertEqual(remaining, [{'n': 1}, {'n': 2}])
+
+if __name__ == '__main__':
+    unittest.main()